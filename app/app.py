@@ -5,20 +5,38 @@ from flask_socketio import SocketIO, emit
 from vulcan.file_loader import create_layout_from_filepath
 
 from logger import log
-from services.server_methods import instance_requested
+from services.server_methods import instance_requested, instances_requested
 from services.process_parse_data import process_parse_data
-from db.models import db
+from db.compression import blob_compressor, DICTIONARY_SAMPLES
+from db.models import configure_sqlite, db, upgrade_schema
 from services.get_user_layout import (
     get_stored_layout,
+    get_stored_layout_by_id,
     get_and_unpack_layout,
+    get_layout_metadata,
     unpack_layout,
-    unpack_search_filters,
 )
-from services.send_layout_to_client import send_layout_to_client
-from services.search import handle_search
+from services.send_layout_to_client import LayoutMetadata, send_layout_to_client
+from services.search import search_flights
+from services.search_jobs import SearchJobs
+from services.search_pool import search_pool
+from services.layout_cache import layout_cache
+from services.payload_cache import payload_cache
+from services.client_capabilities import client_capabilities
+from services.prefetch import Prefetcher
+from services.http_instances import make_instance_response
+from services.stored_instances import get_instance_samples
+from services.request_coalescing import (
+    instance_requests,
+    INSTANCE_REQUEST_DEBOUNCE_MS,
+)
+from utils import raw_json
+from utils.timestamps import touch_table
+from utils.write_queue import write_queue
 
 # TODO: Handle CORS properly.
-socketio = SocketIO(cors_allowed_origins="*")
+# Instance payloads are sent pre-encoded (see services.payload_cache).
+socketio = SocketIO(cors_allowed_origins="*", json=raw_json)
 
 # Used if no input is provided.
 STANDARD_LAYOUT_INPUT_PATH = "./standard.pickle"
@@ -39,7 +57,14 @@ def get_secret_key() -> str:
     return secret_key
 
 
-def create_app() -> Flask:
+def create_app(start_background_tasks: bool = True) -> Flask:
+    """
+    Create the server. Scripts that only use the database (e.g.
+    remove_old_layouts.py) pass start_background_tasks=False, so that the
+    search processes, the write queue and the timestamp flusher are not
+    started and no compression dictionary is trained. Their writes are then
+    committed immediately.
+    """
     log.info("Creating app...")
 
     log.info("Creating standard layout...")
@@ -49,6 +74,8 @@ def create_app() -> Flask:
         propbank_path=None,
     )
 
+    standard_layout_metadata = LayoutMetadata.from_layout(standard_layout)
+
     log.info("Standard layout created.")
 
     app = Flask(__name__)
@@ -62,6 +89,29 @@ def create_app() -> Flask:
             return {"ok": True}, 200
         return {"ok": False}, 500
 
+    @app.route("/stats/", methods=["GET"])
+    def stats():
+        return {
+            "layout_cache": layout_cache.stats(),
+            "payload_cache": payload_cache.stats(),
+            "skipped_instance_requests": instance_requests.skipped,
+            "write_queue": write_queue.stats(),
+        }, 200
+
+    @app.route("/standard/instance/<int:index>", methods=["GET"])
+    def get_standard_instance(index: int):
+        return make_instance_response(request, standard_layout, index)
+
+    @app.route("/layout/<parse_id>/instance/<int:index>", methods=["GET"])
+    def get_stored_instance(parse_id: str, index: int):
+        stored_layout = get_stored_layout_by_id(parse_id, db)
+        layout = (
+            unpack_layout(stored_layout, standard_layout, db)
+            if stored_layout
+            else None
+        )
+        return make_instance_response(request, layout, index)
+
     @app.route("/", methods=["POST"])
     def handle_parse_request():
         log.debug("Handling parse request!")
@@ -79,46 +129,98 @@ def create_app() -> Flask:
     @socketio.on("connect")
     def handle_connect():
         log.debug("Client connected")
+        client_capabilities.register(request.sid, request.args.get("capabilities"))
 
         stored_layout = get_stored_layout(request, db)
         if stored_layout:
-            layout = unpack_layout(stored_layout)
-            search_filters = (
-                unpack_search_filters(stored_layout.search_filters)
-                if stored_layout.search_filters
-                else []
-            )
+            metadata = get_layout_metadata(stored_layout, standard_layout, db)
+
+            def load_layout():
+                return unpack_layout(stored_layout, standard_layout, db)
+
         else:
             log.info("No layout found for user. Using standard layout.")
-            layout = standard_layout
-            search_filters = []
+            metadata = standard_layout_metadata
+
+            def load_layout():
+                return standard_layout
 
         sid = request.sid
-        send_layout_to_client(sid, layout, search_filters)
+        if metadata is None:
+            emit("server_error", to=sid)
+            return
+        prefetcher.announce_window(sid)
+        layout = send_layout_to_client(sid, metadata, load_layout)
+        if layout is not None:
+            prefetcher.schedule(sid, layout, 0)
 
     @socketio.on("disconnect")
     def handle_disconnect():
         log.debug("Client disconnected")
+        search_jobs.cancel(request.sid)
+        prefetcher.cancel(request.sid)
+        instance_requests.remove(request.sid)
+        client_capabilities.remove(request.sid)
 
-    @socketio.on("instance_requested")
-    def handle_instance_requested(index):
-        layout = get_and_unpack_layout(request, db)
+    def get_requested_layout():
+        layout = get_and_unpack_layout(request, db, standard_layout)
         if layout is None:
             log.info(
                 f"No layout found for user on requesting instance. Using standard layout."
             )
             layout = standard_layout
-        instance_requested(request.sid, layout, index)
+        return layout
+
+    @socketio.on("instance_requested")
+    def handle_instance_requested(index):
+        """
+        Send an instance to the client, unless the client requests another
+        instance before this one is sent.
+        """
+        sid = request.sid
+        ticket = instance_requests.begin(sid)
+        try:
+            # Let newer requests of the client that have already arrived
+            # supersede this one.
+            socketio.sleep(INSTANCE_REQUEST_DEBOUNCE_MS / 1000)
+            if not instance_requests.is_latest(sid, ticket):
+                return
+            layout = get_requested_layout()
+            if not instance_requests.is_latest(sid, ticket):
+                return
+            instance_requested(sid, layout, index)
+            prefetcher.schedule(sid, layout, index)
+        finally:
+            instance_requests.end(sid, ticket)
+
+    @socketio.on("instances_requested")
+    def handle_instances_requested(start, count, slices=None):
+        """
+        Send a page of instances, e.g. for a list of sentences.
+        """
+        instances_requested(request.sid, get_requested_layout(), start, count, slices)
+
+    @socketio.on("prefetch_requested")
+    def handle_prefetch_requested(index):
+        """
+        The client showed an instance it had prefetched. Prefetch the
+        instances around it.
+        """
+        prefetcher.schedule(request.sid, get_requested_layout(), index)
 
     @socketio.on("perform_search")
     def perform_search(data):
         """
-        Perform a search on the current layout and reroute to it.
+        Start a search on the current layout as a background job. The job
+        reports its progress and reroutes the client to the result when done.
         """
         log.debug("Search requested")
-        result_identifier = handle_search(db, data, standard_layout)
-        log.debug("Search successful. Rerouting to result.")
-        emit("route_to_layout", result_identifier, to=request.sid)
+        search_jobs.start(request.sid, data)
+
+    @socketio.on("cancel_search")
+    def cancel_search():
+        if search_jobs.cancel(request.sid):
+            emit("search_cancelled", to=request.sid)
 
     @socketio.on("clear_search")
     def clear_search():
@@ -131,8 +233,34 @@ def create_app() -> Flask:
     socketio.init_app(app)
     db.init_app(app)
 
+    search_jobs = SearchJobs(socketio, app, db, standard_layout)
+    prefetcher = Prefetcher(socketio, app)
+    # Searches yield to other tasks while they run, so clients that wait for
+    # an identical search must wait without blocking the event loop.
+    search_flights.create_event = socketio.server.eio.create_event
+
     with app.app_context():
+        configure_sqlite(db)
         db.create_all()
+        upgrade_schema(db)
+
+    if not start_background_tasks:
+        log.info("Vulcan initialised without background tasks.")
+        return app
+
+    search_pool.start(
+        STANDARD_LAYOUT_INPUT_PATH,
+        standard_layout.corpus_size,
+        sleep=socketio.sleep,
+    )
+    with app.app_context():
+        blob_compressor.start(
+            db,
+            lambda: get_instance_samples(standard_layout, DICTIONARY_SAMPLES),
+        )
+    # All writes go through the write queue (see utils.write_queue).
+    write_queue.start(socketio, app, db)
+    touch_table.start_flushing(socketio, app, db)
 
     log.info("Vulcan initialised. Waiting for connections...")
 
@@ -0,0 +1,190 @@
+import os
+import zlib
+from datetime import datetime
+from threading import Lock
+from typing import Callable
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+from flask_sqlalchemy import SQLAlchemy
+
+from db.models import CompressionDictionary
+from logger import log
+
+# Codec that new blobs are compressed with: "zstd", "zlib" or "none". By
+# default zstd is used if it is available (Python 3.14+), and zlib otherwise.
+COMPRESSION = os.environ.get("VULCAN_COMPRESSION", "zstd" if zstd else "zlib")
+
+# Maximum size of a trained dictionary, in bytes. zlib only uses the last
+# 32 KiB of its dictionary.
+ZSTD_DICTIONARY_SIZE = 112 * 1024
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+
+# Number of sample blobs that a dictionary is trained on.
+DICTIONARY_SAMPLES = 2000
+
+
+class BlobCompressor:
+    """
+    Compresses the blobs of stored layouts (pickled layouts, instances and
+    search filters) with a dictionary that is trained on sample blobs, e.g.
+    instances of the standard layout. Pickled parses repeat the same keys and
+    labels over and over, and a dictionary also lets small blobs such as
+    single instances refer to them.
+
+    Each row records the codec of its blobs as "<codec>:<dictionary id>" (or
+    just "<codec>" without dictionary), so that rows stay readable when the
+    codec or the dictionary changes. Rows without codec are not compressed.
+    Dictionaries are stored in the database, and only trained if there is no
+    dictionary for the codec yet.
+
+    zlib has no dictionary trainer, so its dictionary is made of sample
+    blobs, which zlib uses as a preset window.
+    """
+
+    def __init__(self):
+        self.codec: str | None = None
+        self.dictionary_id: int | None = None
+        # dictionary id -> dictionary of its codec
+        self._dictionaries: dict[int, object] = {}
+        self._lock = Lock()
+
+    def start(
+        self,
+        db: SQLAlchemy,
+        get_samples: Callable[[], list[bytes]],
+        codec: str = COMPRESSION,
+    ) -> None:
+        """
+        Compress new blobs with the codec, using its stored dictionary, or a
+        dictionary trained on the samples if there is none yet.
+        """
+        if codec == "none":
+            return
+        if codec == "zstd" and zstd is None:
+            log.warning("zstd is not available. Compressing with zlib instead.")
+            codec = "zlib"
+        if codec not in ("zstd", "zlib"):
+            raise ValueError(f"Unknown compression: {codec}. Use zstd, zlib or none.")
+
+        stored_dictionary = (
+            db.session.query(CompressionDictionary)
+            .filter_by(codec=codec)
+            .order_by(CompressionDictionary.id.desc())
+            .first()
+        )
+        if stored_dictionary is None:
+            data = train_dictionary(codec, get_samples())
+            if data is not None:
+                stored_dictionary = CompressionDictionary(
+                    codec=codec, data=data, created=datetime.now()
+                )
+                db.session.add(stored_dictionary)
+                db.session.commit()
+                log.info(f"Trained a {codec} dictionary of {len(data)} bytes.")
+
+        self.codec = codec
+        if stored_dictionary is not None:
+            self.dictionary_id = stored_dictionary.id
+            self._dictionaries[stored_dictionary.id] = load_dictionary(
+                codec, stored_dictionary.data
+            )
+
+    def compress(self, blobs: list[bytes]) -> tuple[list[bytes], str | None]:
+        """
+        Compress blobs that are stored in the same row. Returns the compressed
+        blobs and their codec.
+        """
+        codec, dictionary_id = self.codec, self.dictionary_id
+        if codec is None:
+            return blobs, None
+        dictionary = self._dictionaries.get(dictionary_id)
+        if codec == "zstd":
+            compressed = [zstd.compress(blob, zstd_dict=dictionary) for blob in blobs]
+        else:
+            compressed = []
+            for blob in blobs:
+                compressor = (
+                    zlib.compressobj(zdict=dictionary)
+                    if dictionary is not None
+                    else zlib.compressobj()
+                )
+                compressed.append(compressor.compress(blob) + compressor.flush())
+        if dictionary_id is None:
+            return compressed, codec
+        return compressed, f"{codec}:{dictionary_id}"
+
+    def decompress(self, db: SQLAlchemy, data: bytes, codec: str | None) -> bytes:
+        """
+        Decompress a blob that was compressed with the given codec.
+        """
+        if codec is None:
+            return data
+        name, _, dictionary_id = codec.partition(":")
+        dictionary = (
+            self._get_dictionary(db, int(dictionary_id)) if dictionary_id else None
+        )
+        if name == "zstd":
+            if zstd is None:
+                raise LookupError("zstd is not available to decompress the blob.")
+            return zstd.decompress(data, zstd_dict=dictionary)
+        if name == "zlib":
+            decompressor = (
+                zlib.decompressobj(zdict=dictionary)
+                if dictionary is not None
+                else zlib.decompressobj()
+            )
+            return decompressor.decompress(data) + decompressor.flush()
+        raise LookupError(f"Unknown codec: {codec}")
+
+    def _get_dictionary(self, db: SQLAlchemy, dictionary_id: int):
+        with self._lock:
+            dictionary = self._dictionaries.get(dictionary_id)
+        if dictionary is not None:
+            return dictionary
+
+        stored_dictionary = db.session.get(CompressionDictionary, dictionary_id)
+        if stored_dictionary is None:
+            raise LookupError(f"Compression dictionary {dictionary_id} is missing.")
+        dictionary = load_dictionary(stored_dictionary.codec, stored_dictionary.data)
+        with self._lock:
+            self._dictionaries[dictionary_id] = dictionary
+        return dictionary
+
+
+def train_dictionary(codec: str, samples: list[bytes]) -> bytes | None:
+    """
+    Train a dictionary for the codec on the samples. Returns None if there are
+    not enough samples.
+    """
+    samples = [sample for sample in samples if sample]
+    if not samples:
+        return None
+    if codec == "zstd":
+        try:
+            return zstd.train_dict(samples, ZSTD_DICTIONARY_SIZE).dict_content
+        except zstd.ZstdError as e:
+            log.warning(f"Could not train a zstd dictionary: {e}")
+            return None
+    # zlib prefers the most common strings at the end of the dictionary, and
+    # every sample repeats the same keys, so the last samples will do.
+    dictionary = b""
+    for sample in reversed(samples):
+        dictionary = sample + dictionary
+        if len(dictionary) >= ZLIB_DICTIONARY_SIZE:
+            break
+    return dictionary[-ZLIB_DICTIONARY_SIZE:]
+
+
+def load_dictionary(codec: str, data: bytes):
+    if codec == "zstd":
+        if zstd is None:
+            raise LookupError("zstd is not available to load the dictionary.")
+        return zstd.ZstdDict(data)
+    return data
+
+
+blob_compressor = BlobCompressor()
@@ -0,0 +1,243 @@
+import hashlib
+import os
+import tempfile
+import time
+from threading import Lock
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
+
+from db.models import StoredInstance, StoredLayout
+from logger import log
+
+# Where the blobs of stored layouts are kept: "sqlite" (in the database),
+# "filesystem" (in files under VULCAN_LAYOUT_STORE_PATH) or "memory".
+LAYOUT_STORE = os.environ.get("VULCAN_LAYOUT_STORE", "sqlite")
+LAYOUT_STORE_PATH = os.environ.get("VULCAN_LAYOUT_STORE_PATH", "./layout_blobs")
+
+# Blobs that are younger than this many seconds are never removed, since the
+# rows that refer to them may not have been committed yet.
+UNREFERENCED_BLOB_MIN_AGE = 3600
+
+# Column values that refer to a blob in a content-addressed store.
+BLOB_REFERENCE_PREFIX = b"sha256:"
+BLOB_REFERENCE_LENGTH = len(BLOB_REFERENCE_PREFIX) + 64
+
+
+class LayoutStore:
+    """
+    Stores the blobs of stored layouts: the pickled layout of each StoredLayout
+    row and the data of each StoredInstance row. The rows themselves, with all
+    other columns, are always kept in the database.
+
+    put() returns the value that is kept in the blob column of the row, and
+    get() returns the blob for such a value.
+    """
+
+    def put(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def get(self, value: bytes) -> bytes:
+        raise NotImplementedError
+
+    def remove_unreferenced(self, db: SQLAlchemy) -> int:
+        """
+        Remove the blobs that no row refers to anymore. Returns the number of
+        removed blobs.
+        """
+        raise NotImplementedError
+
+
+class SQLiteLayoutStore(LayoutStore):
+    """
+    Keeps the blobs in the rows themselves.
+    """
+
+    def put(self, data: bytes) -> bytes:
+        return data
+
+    def get(self, value: bytes) -> bytes:
+        if is_blob_reference(value):
+            raise LookupError(
+                "The layout is kept in a content-addressed layout store. "
+                "Set VULCAN_LAYOUT_STORE to read it."
+            )
+        return value
+
+    def remove_unreferenced(self, db: SQLAlchemy) -> int:
+        # Blobs are removed with their rows.
+        return 0
+
+
+class ContentAddressedLayoutStore(LayoutStore):
+    """
+    Keeps each distinct blob once, under its SHA-256 hash, and refers to it
+    from the rows by "sha256:<hash>". Identical blobs (e.g. the same parse
+    uploaded twice) are therefore only stored once.
+
+    Rows that still hold their blob, because they were written by the SQLite
+    store, can be read as well.
+    """
+
+    def put(self, data: bytes) -> bytes:
+        digest = hashlib.sha256(data).hexdigest()
+        self._write_blob(digest, data)
+        return BLOB_REFERENCE_PREFIX + digest.encode("ascii")
+
+    def get(self, value: bytes) -> bytes:
+        if not is_blob_reference(value):
+            return value
+        digest = value[len(BLOB_REFERENCE_PREFIX) :].decode("ascii")
+        data = self._read_blob(digest)
+        if data is None:
+            raise LookupError(f"Blob {digest} is missing from the layout store.")
+        return data
+
+    def remove_unreferenced(self, db: SQLAlchemy) -> int:
+        referenced = get_referenced_digests(db)
+        oldest_allowed_creation = time.time() - UNREFERENCED_BLOB_MIN_AGE
+        removed = 0
+        for digest, created in self._list_blobs():
+            if digest not in referenced and created < oldest_allowed_creation:
+                self._remove_blob(digest)
+                removed += 1
+        log.debug(f"Removed {removed} unreferenced blobs")
+        return removed
+
+    def _write_blob(self, digest: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def _read_blob(self, digest: str) -> bytes | None:
+        raise NotImplementedError
+
+    def _list_blobs(self) -> list[tuple[str, float]]:
+        """
+        The digest and creation time of every stored blob.
+        """
+        raise NotImplementedError
+
+    def _remove_blob(self, digest: str) -> None:
+        raise NotImplementedError
+
+
+class FilesystemLayoutStore(ContentAddressedLayoutStore):
+    """
+    Keeps the blobs in files under a root directory, sharded by the first two
+    bytes of their hash (<root>/ab/cd/abcd...), so that no directory grows
+    too large. Reads are then served from the OS page cache, and the database
+    only holds the references.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _get_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _write_blob(self, digest: str, data: bytes) -> None:
+        path = self._get_path(digest)
+        if os.path.exists(path):
+            # Mark the blob as recently used, so it is not removed before the
+            # new reference to it has been committed.
+            os.utime(path)
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first, so that readers never see a
+        # partially written blob.
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as f:
+                f.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def _read_blob(self, digest: str) -> bytes | None:
+        try:
+            with open(self._get_path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _list_blobs(self) -> list[tuple[str, float]]:
+        blobs = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if len(filename) == 64:
+                    path = os.path.join(directory, filename)
+                    blobs.append((filename, os.path.getmtime(path)))
+        return blobs
+
+    def _remove_blob(self, digest: str) -> None:
+        try:
+            os.unlink(self._get_path(digest))
+        except FileNotFoundError:
+            pass
+
+
+class InMemoryLayoutStore(ContentAddressedLayoutStore):
+    """
+    Keeps the blobs in memory, for tests and benchmarks. They are lost when
+    the server stops.
+    """
+
+    def __init__(self):
+        # digest -> (blob, time at which it was last stored)
+        self._blobs: dict[str, tuple[bytes, float]] = {}
+        self._lock = Lock()
+
+    def _write_blob(self, digest: str, data: bytes) -> None:
+        with self._lock:
+            self._blobs[digest] = (data, time.time())
+
+    def _read_blob(self, digest: str) -> bytes | None:
+        with self._lock:
+            blob = self._blobs.get(digest)
+        return blob[0] if blob is not None else None
+
+    def _list_blobs(self) -> list[tuple[str, float]]:
+        with self._lock:
+            return [(digest, created) for digest, (_, created) in self._blobs.items()]
+
+    def _remove_blob(self, digest: str) -> None:
+        with self._lock:
+            self._blobs.pop(digest, None)
+
+
+def is_blob_reference(value: bytes) -> bool:
+    return len(value) == BLOB_REFERENCE_LENGTH and value.startswith(
+        BLOB_REFERENCE_PREFIX
+    )
+
+
+def get_referenced_digests(db: SQLAlchemy) -> set[str]:
+    """
+    The digests of all blobs that rows refer to.
+    """
+    digests = set()
+    for column in [StoredLayout.layout, StoredInstance.data]:
+        # Only read values that can be references, not inline blobs.
+        values = db.session.query(column).filter(
+            func.length(column) == BLOB_REFERENCE_LENGTH
+        )
+        for (value,) in values:
+            if is_blob_reference(value):
+                digests.add(value[len(BLOB_REFERENCE_PREFIX) :].decode("ascii"))
+    return digests
+
+
+def create_layout_store(kind: str = LAYOUT_STORE) -> LayoutStore:
+    if kind == "sqlite":
+        return SQLiteLayoutStore()
+    if kind == "filesystem":
+        return FilesystemLayoutStore(LAYOUT_STORE_PATH)
+    if kind == "memory":
+        return InMemoryLayoutStore()
+    raise ValueError(
+        f"Unknown layout store: {kind}. Use 'sqlite', 'filesystem' or 'memory'."
+    )
+
+
+layout_store = create_layout_store()
@@ -1,15 +1,125 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import relationship
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import deferred, relationship
 
 db = SQLAlchemy()
 
+# Pragmas that are set on every SQLite connection. In WAL mode, readers do not
+# wait for the writer and vice versa. Commits then only need to be synced to
+# disk at checkpoints (synchronous=NORMAL), which keeps the database
+# consistent but may lose the last commits on a power failure. Connections
+# that find the database locked retry for up to busy_timeout milliseconds.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "temp_store": "MEMORY",
+}
+
 
 class StoredLayout(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     parse_id = db.Column(db.String(36), unique=True, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False)
-    layout = db.Column(db.LargeBinary, nullable=False)
-    search_filters = db.Column(db.LargeBinary, nullable=True)
+    # Deferred, so that the blob is only read when the layout is not cached.
+    layout = deferred(db.Column(db.LargeBinary, nullable=False))
+    # Deferred, since clients are sent the active filters from active_filters.
+    search_filters = deferred(db.Column(db.LargeBinary, nullable=True))
+    # Canonical key of the search filters, used to reuse identical searches.
+    search_key = db.Column(db.String(64), nullable=True, index=True)
+    # Metadata that is sent to clients on connect (see LayoutMetadata in
+    # services.send_layout_to_client): the slices by row and the serialized
+    # active search filters as JSON, and the corpus size. Missing for layouts
+    # stored by older versions until they are first requested.
+    layout_schema = db.Column(db.Text, nullable=True)
+    corpus_size = db.Column(db.Integer, nullable=True)
+    active_filters = db.Column(db.Text, nullable=True)
+    # Codec of the layout and search filters blobs (see db.compression).
+    # None for uncompressed blobs.
+    codec = db.Column(db.String(32), nullable=True)
+    # SHA-256 hash of the uploaded parse results, used to store identical
+    # uploads once.
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    # Parse ID that the StoredInstance rows of the layout are stored under, if
+    # they are shared with an earlier upload of the same parse results. None
+    # if they are stored under the layout's own parse ID.
+    instances_parse_id = db.Column(db.String(36), nullable=True, index=True)
 
     def __repr__(self):
         return f"<StoredLayout {self.parse_id} ({self.timestamp})>"
+
+
+class StoredInstance(db.Model):
+    """
+    The data of one instance of a stored parse, for parses whose StoredLayout
+    only holds the metadata of the layout (see services.stored_instances).
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    parse_id = db.Column(db.String(36), nullable=False)
+    instance_index = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    # Codec of the data (see db.compression). None for uncompressed data.
+    codec = db.Column(db.String(32), nullable=True)
+
+    # Also serves as the index for looking up an instance.
+    __table_args__ = (db.UniqueConstraint("parse_id", "instance_index"),)
+
+    def __repr__(self):
+        return f"<StoredInstance {self.parse_id} #{self.instance_index}>"
+
+
+class CompressionDictionary(db.Model):
+    """
+    A dictionary that blobs of stored layouts are compressed with.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    codec = db.Column(db.String(16), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<CompressionDictionary {self.id} ({self.codec})>"
+
+
+def upgrade_schema(db: SQLAlchemy) -> None:
+    """
+    Adds columns (and their indices) that are missing from existing tables.
+
+    db.create_all() only creates missing tables, so databases created by an
+    older version of the server need this to pick up new columns. New columns
+    must therefore be nullable.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def configure_sqlite(db: SQLAlchemy) -> None:
+    """
+    Sets SQLITE_PRAGMAS on every new connection of the engine. Must be called
+    before the first connection is made.
+    """
+
+    @event.listens_for(db.engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
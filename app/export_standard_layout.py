@@ -0,0 +1,119 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from vulcan.file_loader import create_layout_from_filepath
+
+from app import STANDARD_LAYOUT_INPUT_PATH
+from logger import log
+from services.send_layout_to_client import build_layout_events, LayoutMetadata
+from services.server_methods import bundle_instance_payloads, encode_instance_events
+
+
+# Writes the standard layout as static files that a web server (e.g. NGINX with
+# gzip_static) can serve without running the app:
+# - standard/handshake.json: the events that describe the layout on connect,
+#   as {"events": [[event, data], ...]};
+# - standard/instance/<index>: each instance, in the same format as the
+#   /standard/instance/<index> endpoint;
+# - standard/manifest.json: the corpus size and the SHA-256 hash (usable as
+#   ETag) and size of every file.
+# Each file is also written gzip-compressed (.gz) and, if the brotli package is
+# installed, brotli-compressed (.br). See the README for how to serve the files
+# with NGINX.
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export the standard layout as static files."
+    )
+    parser.add_argument("output_dir", help="Directory to write the files to.")
+    parser.add_argument(
+        "--input",
+        default=STANDARD_LAYOUT_INPUT_PATH,
+        help=f"Pickled standard layout (default: {STANDARD_LAYOUT_INPUT_PATH}).",
+    )
+    args = parser.parse_args()
+
+    log.info("Creating standard layout...")
+    layout = create_layout_from_filepath(
+        input_path=args.input,
+        is_json_file=False,
+        propbank_path=None,
+    )
+
+    files = {}
+    handshake = {"events": build_layout_events(LayoutMetadata.from_layout(layout))}
+    files["standard/handshake.json"] = write_file(
+        args.output_dir,
+        "standard/handshake.json",
+        json.dumps(handshake, separators=(",", ":")).encode("utf-8"),
+    )
+    for index in range(layout.corpus_size):
+        payloads = encode_instance_events(layout, index)
+        path = f"standard/instance/{index}"
+        files[path] = write_file(
+            args.output_dir,
+            path,
+            bundle_instance_payloads(index, payloads).encoded.encode("utf-8"),
+        )
+
+    manifest = {
+        "created": datetime.now().isoformat(),
+        "corpus_size": layout.corpus_size,
+        "files": files,
+    }
+    write_file(
+        args.output_dir,
+        "standard/manifest.json",
+        json.dumps(manifest, indent=2).encode("utf-8"),
+    )
+    log.info(f"Exported {layout.corpus_size} instances to {args.output_dir}.")
+
+
+def write_file(output_dir: str, path: str, body: bytes) -> dict:
+    """
+    Write a file and its compressed versions. Returns the manifest entry of
+    the file.
+    """
+    full_path = os.path.join(output_dir, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    write_if_changed(full_path, body)
+
+    entry = {"sha256": hashlib.sha256(body).hexdigest(), "size": len(body)}
+    # mtime=0 keeps the output identical between exports of the same layout.
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    write_if_changed(full_path + ".gz", compressed)
+    entry["gzip_size"] = len(compressed)
+    if brotli is not None:
+        compressed = brotli.compress(body)
+        write_if_changed(full_path + ".br", compressed)
+        entry["brotli_size"] = len(compressed)
+    return entry
+
+
+def write_if_changed(full_path: str, data: bytes) -> None:
+    """
+    Write a file, unless it already has this content. Unchanged files keep
+    their modification time, from which web servers such as NGINX derive the
+    ETag and Last-Modified headers, so clients do not download them again
+    after a new export.
+    """
+    try:
+        with open(full_path, "rb") as f:
+            if f.read() == data:
+                return
+    except FileNotFoundError:
+        pass
+    with open(full_path, "wb") as f:
+        f.write(data)
+
+
+if __name__ == "__main__":
+    main()
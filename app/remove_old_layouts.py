@@ -4,7 +4,7 @@ from utils.timestamps import remove_old_layouts
 
 # Designed to run as part of a cronjob (or similar) to remove old layouts from the database.
 def main() -> None:
-    app = create_app()
+    app = create_app(start_background_tasks=False)
     with app.app_context():
         remove_old_layouts(db)
 
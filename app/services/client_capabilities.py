@@ -0,0 +1,47 @@
+from threading import Lock
+
+# Capabilities a client can announce in the `capabilities` query parameter of
+# its connection, as a comma-separated list.
+# - set_instance: the client handles the bundled set_instance event, which
+#   replaces the set_table, set_graph and set_linker events of an instance.
+# - prefetch: the client handles prefetch_instance events (see
+#   services.prefetch).
+KNOWN_CAPABILITIES = {"set_instance", "prefetch"}
+
+
+class ClientCapabilities:
+    """
+    The optional protocol features that each connected client supports, so
+    that older clients keep receiving the events they know.
+    """
+
+    def __init__(self):
+        self._capabilities: dict[str, frozenset[str]] = {}
+        self._lock = Lock()
+
+    def register(self, sid: str, announced: str | None) -> None:
+        """
+        Store the capabilities a client announced on connect. Unknown
+        capabilities are ignored.
+        """
+        capabilities = frozenset(
+            capability.strip()
+            for capability in (announced or "").split(",")
+            if capability.strip() in KNOWN_CAPABILITIES
+        )
+        with self._lock:
+            if capabilities:
+                self._capabilities[sid] = capabilities
+            else:
+                self._capabilities.pop(sid, None)
+
+    def remove(self, sid: str) -> None:
+        with self._lock:
+            self._capabilities.pop(sid, None)
+
+    def has(self, sid: str, capability: str) -> bool:
+        with self._lock:
+            return capability in self._capabilities.get(sid, ())
+
+
+client_capabilities = ClientCapabilities()
@@ -2,14 +2,27 @@ import pickle
 
 from flask import Request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import update
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 
 from vulcan.file_loader import BasicLayout
 from vulcan.search.search import SearchFilter
 
+from db.compression import blob_compressor
+from db.layout_store import layout_store
 from db.models import StoredLayout
 from logger import log
-from utils.timestamps import update_timestamp
+from services.layout_cache import layout_cache
+from services.layout_view import LayoutView
+from services.send_layout_to_client import LayoutMetadata
+from services.stored_instances import (
+    get_instances_parse_id,
+    LayoutSkeleton,
+    load_stored_instance,
+    load_stored_instances,
+)
+from utils.timestamps import touch_table
+from utils.write_queue import write_queue
 
 
 def get_stored_layout(request: Request, db: SQLAlchemy) -> StoredLayout | None:
@@ -20,10 +33,19 @@ def get_stored_layout(request: Request, db: SQLAlchemy) -> StoredLayout | None:
     database, or if multiple layouts are found for the user, None will be
     returned.
 
-    Everytime we access a stored layout, we update its timestamp.
+    Everytime we access a stored layout, we update its timestamp. Timestamps
+    are written to the database periodically (see utils.timestamps.TouchTable).
     """
-    parse_id = request.args.get("id")
+    return get_stored_layout_by_id(request.args.get("id"), db)
 
+
+def get_stored_layout_by_id(
+    parse_id: str | None, db: SQLAlchemy
+) -> StoredLayout | None:
+    """
+    Get the StoredLayout object with the given parse ID, or None if there is
+    no such layout (see get_stored_layout).
+    """
     if parse_id is None or parse_id == "":
         log.info("No layout ID provided.")
         return None
@@ -36,42 +58,120 @@ def get_stored_layout(request: Request, db: SQLAlchemy) -> StoredLayout | None:
     except MultipleResultsFound:
         log.error(f"Multiple layouts found with ID {parse_id}.")
 
-    update_timestamp(db, layout)
+    if layout is not None:
+        touch_table.touch(layout.parse_id)
     return layout
 
 
-def unpack_layout(layout_object: StoredLayout) -> BasicLayout | None:
+def unpack_layout(
+    layout_object: StoredLayout, standard_layout: BasicLayout, db: SQLAlchemy
+) -> BasicLayout | None:
     """
     Unpickles the layout data from a StoredLayout DB object.
+
+    Search results are stored as LayoutViews over the standard layout. These
+    are resolved against the standard layout before they are returned. Parses
+    are stored as LayoutSkeletons, whose instances are loaded from the
+    database when they are accessed.
+
+    Unpickled layouts are kept in the in-memory layout cache, so the layout
+    blob is only read from the database and unpickled on a cache miss.
     """
-    pickled_layout = layout_object.layout
+    cached_layout = layout_cache.get(layout_object.parse_id)
+    if cached_layout is not None:
+        return cached_layout
+
     try:
+        pickled_layout = blob_compressor.decompress(
+            db, layout_store.get(layout_object.layout), layout_object.codec
+        )
         layout = pickle.loads(pickled_layout)
-    except pickle.UnpicklingError:
+    except (LookupError, pickle.UnpicklingError):
         log.error(
-            f"An error occurred while unpickling the layout for ID {layout_object.parse_id}."
+            f"An error occurred while loading the layout for ID {layout_object.parse_id}."
         )
         return None
+
+    if isinstance(layout, LayoutSkeleton):
+        parse_id = get_instances_parse_id(layout_object)
+        layout = layout.resolve(
+            lambda index: load_stored_instance(db, parse_id, index),
+            lambda start, stop: load_stored_instances(db, parse_id, start, stop),
+        )
+    elif isinstance(layout, LayoutView):
+        if not layout.fits(standard_layout):
+            log.error(
+                f"Search result {layout_object.parse_id} does not fit the current standard layout."
+            )
+            return None
+        layout = layout.resolve(standard_layout)
+
+    layout_cache.put(layout_object.parse_id, layout, len(pickled_layout))
     return layout
 
 
-def get_and_unpack_layout(request: Request, db: SQLAlchemy) -> BasicLayout | None:
+def get_layout_metadata(
+    layout_object: StoredLayout, standard_layout: BasicLayout, db: SQLAlchemy
+) -> LayoutMetadata | None:
+    """
+    Get the metadata that is sent to the client on connect from the metadata
+    columns of a StoredLayout DB object, without unpickling the layout.
+
+    Layouts stored by older versions of the server have no metadata columns.
+    These are unpacked instead, and their columns are filled so that later
+    requests can use them. Returns None if the layout cannot be unpacked.
+    """
+    metadata = LayoutMetadata.from_columns(
+        layout_object.layout_schema,
+        layout_object.corpus_size,
+        layout_object.active_filters,
+    )
+    if metadata is not None:
+        return metadata
+
+    layout = unpack_layout(layout_object, standard_layout, db)
+    if layout is None:
+        return None
+    search_filters = (
+        unpack_search_filters(layout_object.search_filters, layout_object.codec, db)
+        if layout_object.search_filters
+        else []
+    )
+    metadata = LayoutMetadata.from_layout(layout, search_filters)
+    statement = (
+        update(StoredLayout)
+        .where(StoredLayout.parse_id == layout_object.parse_id)
+        .values(**metadata.to_columns())
+    )
+    # The client does not have to wait for the columns to be written.
+    write_queue.submit(db, lambda session: session.execute(statement))
+    return metadata
+
+
+def get_and_unpack_layout(
+    request: Request, db: SQLAlchemy, standard_layout: BasicLayout
+) -> BasicLayout | None:
     """
     Convenience method that combines get_stored_layout and unpack_layout.
     """
     stored_layout = get_stored_layout(request, db)
     if stored_layout is None:
         return None
-    return unpack_layout(stored_layout)
+    return unpack_layout(stored_layout, standard_layout, db)
 
 
-def unpack_search_filters(pickled_filters: bytes) -> list[SearchFilter]:
+def unpack_search_filters(
+    pickled_filters: bytes, codec: str | None, db: SQLAlchemy
+) -> list[SearchFilter]:
     """
-    Transform the pickled search filters to a list of SearchFilter objects.
+    Transform the pickled search filters, compressed with the given codec, to
+    a list of SearchFilter objects.
     """
     try:
-        search_filters = pickle.loads(pickled_filters)
-    except pickle.UnpicklingError:
+        search_filters = pickle.loads(
+            blob_compressor.decompress(db, pickled_filters, codec)
+        )
+    except (LookupError, pickle.UnpicklingError):
         log.error("An error occurred while unpickling the search filters.")
         return []
     return search_filters
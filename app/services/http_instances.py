@@ -0,0 +1,34 @@
+import hashlib
+import os
+
+from flask import Request, Response
+
+from vulcan.file_loader import BasicLayout
+
+from services.server_methods import bundle_instance_payloads, get_instance_payloads
+
+# Number of seconds for which HTTP caches (e.g. a reverse proxy) may serve an
+# instance without revalidating it.
+HTTP_CACHE_MAX_AGE = int(os.environ.get("VULCAN_HTTP_CACHE_MAX_AGE", 3600))
+
+
+def make_instance_response(
+    request: Request, layout: BasicLayout | None, index: int
+) -> Response | tuple[dict, int]:
+    """
+    Respond with an instance of the layout in the format of a set_instance
+    event. The response has a strong ETag (a hash of its body) and may be
+    cached publicly, and conditional requests are answered with 304 Not
+    Modified if the instance did not change.
+    """
+    if layout is None or not 0 <= index < layout.corpus_size:
+        return {"ok": False}, 404
+
+    payloads = get_instance_payloads(layout, index)
+    body = bundle_instance_payloads(index, payloads).encoded.encode("utf-8")
+
+    response = Response(body, mimetype="application/json")
+    response.set_etag(hashlib.sha256(body).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = HTTP_CACHE_MAX_AGE
+    return response.make_conditional(request)
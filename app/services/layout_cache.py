@@ -0,0 +1,28 @@
+import os
+
+from vulcan.file_loader import BasicLayout
+
+from utils.lru_cache import LRUCache
+
+# Budget of the cache, in megabytes of pickled layouts. An unpickled layout
+# takes about ten times the size of its pickle in memory, so the default
+# allows for roughly 300 MB. Set to 0 to disable caching.
+LAYOUT_CACHE_PICKLED_MB = int(os.environ.get("VULCAN_LAYOUT_CACHE_PICKLED_MB", 32))
+
+
+class LayoutCache(LRUCache[str, BasicLayout]):
+    """
+    Bounded in-memory LRU cache of unpickled layouts, keyed by parse ID.
+
+    The size of an entry is the size of its pickled blob, which is known
+    without any extra work when the layout is unpickled. This is not the
+    memory the unpickled layout takes (which is several times larger), so the
+    budget is a budget of pickled bytes. Layouts that are larger than the
+    entire budget are not cached.
+    """
+
+    def __init__(self, max_pickled_bytes: int):
+        super().__init__(max_pickled_bytes)
+
+
+layout_cache = LayoutCache(max_pickled_bytes=LAYOUT_CACHE_PICKLED_MB * 1024 * 1024)
@@ -0,0 +1,117 @@
+from collections.abc import Sequence
+from typing import Any
+
+from vulcan.data_handling.data_corpus import CorpusSlice
+from vulcan.file_loader import BasicLayout
+from vulcan.search.search import merge_search_highlights
+
+
+class LayoutView:
+    """
+    A search result, stored as the indices of the matching instances in the
+    searched (standard) layout plus a search highlight overlay per matching
+    instance. This is much smaller than a pickled copy of the matching
+    instances.
+
+    A LayoutView must be resolved against the layout it was created from
+    before it can be sent to the client.
+    """
+
+    def __init__(
+        self,
+        matching_indices: list[int],
+        highlight_dicts: list[dict[tuple[str, Any], str | list[str]]],
+        base_corpus_size: int,
+    ):
+        self.matching_indices = matching_indices
+        self.highlight_dicts = highlight_dicts
+        # Used to detect views that were created from a different layout.
+        self.base_corpus_size = base_corpus_size
+
+    def fits(self, base_layout: BasicLayout) -> bool:
+        return self.base_corpus_size == base_layout.corpus_size
+
+    def resolve(self, base_layout: BasicLayout) -> BasicLayout:
+        """
+        Create a BasicLayout whose instances are looked up lazily in the base
+        layout. The result can be used wherever the searched layout returned by
+        perform_search_on_layout would be used.
+        """
+        slices = []
+        for row in base_layout.layout:
+            for corpus_slice in row:
+                slices.append(
+                    CorpusSlice(
+                        corpus_slice.name,
+                        self._view(corpus_slice.instances),
+                        corpus_slice.visualization_type,
+                        label_alternatives=self._view(corpus_slice.label_alternatives),
+                        highlights=HighlightOverlay(
+                            self._view(corpus_slice.highlights),
+                            self.highlight_dicts,
+                            corpus_slice.name,
+                        ),
+                        mouseover_texts=self._view(corpus_slice.mouseover_texts),
+                        dependency_trees=self._view(corpus_slice.dependency_trees),
+                    )
+                )
+
+        linkers = [
+            {
+                "name1": linker["name1"],
+                "name2": linker["name2"],
+                "scores": self._view(linker["scores"]),
+            }
+            for linker in base_layout.linkers
+        ]
+
+        return BasicLayout(slices, linkers, len(self.matching_indices))
+
+    def _view(self, items: Sequence | None) -> "IndexedView | None":
+        if items is None:
+            return None
+        return IndexedView(items, self.matching_indices)
+
+
+class IndexedView(Sequence):
+    """
+    Read-only view of the items at the given indices of a sequence.
+    """
+
+    def __init__(self, items: Sequence, indices: list[int]):
+        self.items = items
+        self.indices = indices
+
+    def __getitem__(self, index: int) -> Any:
+        return self.items[self.indices[index]]
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
+class HighlightOverlay(Sequence):
+    """
+    Read-only sequence of the highlights of a corpus slice in a search result:
+    the search highlights of each instance merged with its base highlights.
+    """
+
+    def __init__(
+        self,
+        base_highlights: IndexedView | None,
+        highlight_dicts: list[dict[tuple[str, Any], str | list[str]]],
+        slice_name: str,
+    ):
+        self.base_highlights = base_highlights
+        self.highlight_dicts = highlight_dicts
+        self.slice_name = slice_name
+
+    def __getitem__(self, index: int) -> dict[Any, str | list[str]]:
+        base_highlight = (
+            self.base_highlights[index] if self.base_highlights is not None else None
+        )
+        return merge_search_highlights(
+            base_highlight, self.highlight_dicts[index], self.slice_name
+        )
+
+    def __len__(self) -> int:
+        return len(self.highlight_dicts)
@@ -0,0 +1,69 @@
+import itertools
+import os
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+from vulcan.file_loader import BasicLayout
+
+from utils.lru_cache import LRUCache
+from utils.raw_json import RawJSON
+
+# Memory budget for encoded instance payloads, in megabytes. Set to 0 to
+# disable caching.
+PAYLOAD_CACHE_SIZE_MB = int(os.environ.get("VULCAN_PAYLOAD_CACHE_SIZE_MB", 64))
+
+# An encoded payload: the event name and its pre-encoded argument.
+Payload = tuple[str, RawJSON]
+
+
+class PayloadCache:
+    """
+    Bounded in-memory LRU cache of the encoded events that are sent to a
+    client for one instance of a layout, keyed by layout and instance index.
+
+    Layouts are identified by a token that is assigned to each layout object
+    the first time it is seen, so that entries of a layout that has been
+    garbage collected are never served for a new layout that happens to reuse
+    its memory address. Such entries are evicted like any other.
+
+    The size of an entry is the length of its encoded payloads.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._entries: LRUCache[tuple[int, int], list[Payload]] = LRUCache(max_bytes)
+        self._layout_tokens: WeakKeyDictionary[BasicLayout, int] = WeakKeyDictionary()
+        self._next_token = itertools.count()
+        self._lock = Lock()
+
+    def get(self, layout: BasicLayout, instance_id: int) -> list[Payload] | None:
+        """
+        Return the cached payloads of an instance, or None if they are not cached.
+        """
+        return self._entries.get((self._get_layout_token(layout), instance_id))
+
+    def put(
+        self, layout: BasicLayout, instance_id: int, payloads: list[Payload]
+    ) -> None:
+        """
+        Add the payloads of an instance to the cache, evicting the least
+        recently used entries if the memory budget is exceeded.
+        """
+        size = sum(len(payload) for _, payload in payloads)
+        self._entries.put((self._get_layout_token(layout), instance_id), payloads, size)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Counters that can be used to size the cache.
+        """
+        return self._entries.stats()
+
+    def _get_layout_token(self, layout: BasicLayout) -> int:
+        with self._lock:
+            token = self._layout_tokens.get(layout)
+            if token is None:
+                token = next(self._next_token)
+                self._layout_tokens[layout] = token
+            return token
+
+
+payload_cache = PayloadCache(max_bytes=PAYLOAD_CACHE_SIZE_MB * 1024 * 1024)
@@ -0,0 +1,114 @@
+import os
+
+from flask import Flask
+from flask_socketio import SocketIO
+
+from vulcan.file_loader import BasicLayout
+
+from logger import log
+from services.client_capabilities import client_capabilities
+from services.server_methods import (
+    bundle_instance_payloads,
+    get_instance_payloads,
+    preloaded_instances,
+)
+
+# Number of instances before and after the requested one that are pushed to
+# clients that support prefetching. Set to 0 to disable prefetching.
+PREFETCH_WINDOW = int(os.environ.get("VULCAN_PREFETCH_WINDOW", 1))
+
+# Prefetching is skipped while this many clients are being prefetched for.
+MAX_CONCURRENT_PREFETCHES = 32
+
+
+class Prefetcher:
+    """
+    Pushes the instances around the one a client just navigated to as
+    prefetch_instance events, so the client can show the next instance
+    without a round trip.
+
+    Each client has at most one prefetch task. Scheduling a new prefetch
+    cancels the previous one, and tasks yield after every instance, so a
+    client paging quickly does not delay other clients. The instances of a
+    stored parse are loaded with one query per prefetch.
+    """
+
+    def __init__(
+        self, socketio: SocketIO, app: Flask, window: int = PREFETCH_WINDOW
+    ):
+        self.socketio = socketio
+        self.app = app
+        self.window = window
+        # sid -> generation of its current prefetch task
+        self._generations: dict[str, int] = {}
+        self._running = 0
+
+    def announce_window(self, sid: str) -> None:
+        """
+        Tell a client that supports prefetching how many instances are pushed
+        on each side, so that it keeps the ones it may still need.
+        """
+        if client_capabilities.has(sid, "prefetch"):
+            self.socketio.emit("set_prefetch_window", max(self.window, 0), to=sid)
+
+    def schedule(self, sid: str, layout: BasicLayout, index) -> None:
+        if (
+            self.window <= 0
+            or not isinstance(index, int)
+            or not client_capabilities.has(sid, "prefetch")
+        ):
+            return
+        generation = self._generations.get(sid, 0) + 1
+        self._generations[sid] = generation
+        if self._running >= MAX_CONCURRENT_PREFETCHES:
+            log.debug("Too many prefetches running. Skipping prefetch.")
+            return
+        self._running += 1
+        self.socketio.start_background_task(
+            self._prefetch, sid, layout, index, generation
+        )
+
+    def cancel(self, sid: str) -> None:
+        self._generations.pop(sid, None)
+
+    def _prefetch(self, sid: str, layout: BasicLayout, index: int, generation: int):
+        try:
+            # Instances of stored parses are loaded from the database.
+            with self.app.app_context():
+                self._push_neighbours(sid, layout, index, generation)
+        except Exception as e:
+            # Prefetching is best effort. The client requests the instance
+            # again when it needs it.
+            log.exception(e)
+        finally:
+            self._running -= 1
+
+    def _push_neighbours(
+        self, sid: str, layout: BasicLayout, index: int, generation: int
+    ):
+        with preloaded_instances(
+            layout, index - self.window, index + self.window + 1
+        ):
+            for neighbour in get_neighbours(index, layout.corpus_size, self.window):
+                self.socketio.sleep(0)
+                if self._generations.get(sid) != generation:
+                    return
+                payloads = get_instance_payloads(layout, neighbour)
+                self.socketio.emit(
+                    "prefetch_instance",
+                    bundle_instance_payloads(neighbour, payloads),
+                    to=sid,
+                )
+
+
+def get_neighbours(index: int, corpus_size: int, window: int) -> list[int]:
+    """
+    The indices within the window around index, closest first and the next
+    instance before the previous one.
+    """
+    neighbours = []
+    for distance in range(1, window + 1):
+        for neighbour in (index + distance, index - distance):
+            if 0 <= neighbour < corpus_size:
+                neighbours.append(neighbour)
+    return neighbours
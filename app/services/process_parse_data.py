@@ -1,13 +1,15 @@
-import pickle
 import base64
-from datetime import datetime
+import hashlib
 
 from flask import Request
 from flask_sqlalchemy import SQLAlchemy
 
-from db.models import StoredLayout
 from logger import log
 from services.create_layout_from_input import create_layout_from_input
+from services.stored_instances import (
+    reuse_stored_layout,
+    store_layout_instances,
+)
 
 
 class InvalidInput(Exception):
@@ -26,17 +28,18 @@ def process_parse_data(request: Request, db: SQLAlchemy) -> None:
     parse_results, input_id = validate_input(request)
     log.debug('Input validated')
 
-    user_layout = create_layout_from_input(parse_results)
+    # Identical parse results (e.g. of the same example sentences) are
+    # converted and stored only once.
+    content_hash = hashlib.sha256(parse_results).hexdigest()
+    if reuse_stored_layout(db, input_id, content_hash):
+        log.debug('Reused the stored layout of identical parse results')
+        return
 
-    pickled = pickle.dumps(user_layout)
+    user_layout = create_layout_from_input(parse_results)
 
-    new_result = StoredLayout(
-        parse_id=input_id,
-        timestamp=datetime.now(),
-        layout=pickled,
-    )
-    db.session.add(new_result)
-    db.session.commit()
+    # Each instance is stored in its own row, so that serving an instance
+    # does not require reading the whole layout.
+    store_layout_instances(db, input_id, user_layout, content_hash=content_hash)
 
     log.debug('Data stored in DB')
 
@@ -0,0 +1,58 @@
+import itertools
+import os
+from threading import Lock
+
+# Number of milliseconds an instance request waits for a newer request of the
+# same client before it is processed. Requests that are superseded while they
+# wait or while they are processed are dropped either way.
+INSTANCE_REQUEST_DEBOUNCE_MS = int(
+    os.environ.get("VULCAN_INSTANCE_REQUEST_DEBOUNCE_MS", 0)
+)
+
+
+class RequestCoalescer:
+    """
+    Keeps track of the latest request of each client, so that requests that
+    have been superseded by a newer request of the same client can be skipped.
+    Only the result of the latest request matters to a client that, e.g.,
+    holds down the arrow key to page through a corpus.
+    """
+
+    def __init__(self):
+        self._latest: dict[str, int] = {}
+        self._tickets = itertools.count()
+        self._lock = Lock()
+        self.skipped = 0
+
+    def begin(self, sid: str) -> int:
+        """
+        Register a new request of a client, superseding its previous requests.
+        Returns the ticket of the request.
+        """
+        with self._lock:
+            ticket = next(self._tickets)
+            self._latest[sid] = ticket
+            return ticket
+
+    def is_latest(self, sid: str, ticket: int) -> bool:
+        """
+        Whether the request is still the latest of its client. Counts the
+        request as skipped if not.
+        """
+        with self._lock:
+            is_latest = self._latest.get(sid) == ticket
+            if not is_latest:
+                self.skipped += 1
+            return is_latest
+
+    def end(self, sid: str, ticket: int) -> None:
+        with self._lock:
+            if self._latest.get(sid) == ticket:
+                del self._latest[sid]
+
+    def remove(self, sid: str) -> None:
+        with self._lock:
+            self._latest.pop(sid, None)
+
+
+instance_requests = RequestCoalescer()
@@ -1,54 +1,151 @@
+import hashlib
+import json
 import pickle
 from datetime import datetime
+from typing import Callable
 
 from flask_sqlalchemy import SQLAlchemy
 
 from vulcan.file_loader import BasicLayout
-from vulcan.search.search import perform_search_on_layout, SearchFilter
+from vulcan.search.search import find_matches_in_layout, SearchFilter
 
+from db.compression import blob_compressor
+from db.layout_store import layout_store
 from db.models import StoredLayout
 from logger import log
+from services.layout_view import LayoutView
+from services.search_pool import search_pool
+from services.send_layout_to_client import LayoutMetadata
 from services.server_methods import get_search_filters_from_data
 from utils.generate_parse_id import generate_parse_id
+from utils.single_flight import SingleFlight
+from utils.write_queue import write_queue
+
+# Shared by all searches, so that identical concurrent searches run only once.
+search_flights = SingleFlight()
 
 
 def handle_search(
-    db: SQLAlchemy, search_data: dict, standard_layout: BasicLayout
+    db: SQLAlchemy,
+    search_data: dict,
+    standard_layout: BasicLayout,
+    progress: Callable[[int, int, int], None] | None = None,
 ) -> str:
     """
     Apply search filters to the standard layout, save the result  under a newly
     created identifier and return the identifier to the client so the user can
     navigate to the corresponding page.
+
+    The result is saved as a LayoutView over the standard layout rather than as
+    a copy of the matching instances.
+
+    Searches are identified by a canonical key. If a search with the same key
+    has been saved before, its identifier is reused, and identical searches that
+    arrive while the search is running wait for its result.
+
+    If given, progress is passed on to find_matches_in_layout, or to the search
+    pool if searches run in worker processes.
     """
     search_filters = get_search_filters_from_data(search_data)
-    searched_layout = perform_search_on_layout(standard_layout, search_filters)
-    identifier = save_search_result_and_filters(searched_layout, search_filters, db)
+    search_key = get_search_key(search_filters, standard_layout)
 
-    return identifier
+    return search_flights.do(
+        search_key,
+        lambda: find_or_perform_search(
+            db, search_key, search_filters, standard_layout, progress
+        ),
+    )
+
+
+def get_search_key(
+    search_filters: list[SearchFilter], standard_layout: BasicLayout
+) -> str:
+    """
+    Canonical key of a search: a hash of the serialized search filters (in
+    order, since the order determines the order of the highlight colors) and
+    the size of the searched layout.
+    """
+    canonical = json.dumps(
+        {
+            "filters": [search_filter.serialize() for search_filter in search_filters],
+            "corpus_size": standard_layout.corpus_size,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def find_or_perform_search(
+    db: SQLAlchemy,
+    search_key: str,
+    search_filters: list[SearchFilter],
+    standard_layout: BasicLayout,
+    progress: Callable[[int, int, int], None] | None = None,
+) -> str:
+    """
+    Return the identifier of the stored result for the search key, performing
+    and saving the search first if there is none.
+    """
+    existing_result = (
+        db.session.query(StoredLayout.parse_id)
+        .filter_by(search_key=search_key)
+        .first()
+    )
+    if existing_result is not None:
+        log.debug("Reusing stored search result.")
+        return existing_result.parse_id
+
+    if search_pool.enabled:
+        matching_indices, highlight_dicts = search_pool.find_matches(
+            search_filters, progress
+        )
+    else:
+        matching_indices, highlight_dicts = find_matches_in_layout(
+            standard_layout, search_filters, progress
+        )
+    layout_view = LayoutView(
+        matching_indices, highlight_dicts, standard_layout.corpus_size
+    )
+    metadata = LayoutMetadata.from_layout(
+        layout_view.resolve(standard_layout), search_filters
+    )
+    return save_search_result_and_filters(
+        layout_view, search_filters, db, search_key, metadata
+    )
 
 
 def save_search_result_and_filters(
-    layout: BasicLayout,
+    layout: LayoutView,
     search_filters: list[SearchFilter],
     db: SQLAlchemy,
+    search_key: str | None = None,
+    metadata: LayoutMetadata | None = None,
 ) -> str:
     """
     Save the search result and the associated filters in the database.
+
+    If given, the metadata is stored alongside, so that clients can be sent
+    the handshake without unpickling the result.
     """
 
-    pickled_layout = pickle.dumps(layout)
-    pickled_search_filters = pickle.dumps(search_filters)
+    [pickled_layout, pickled_search_filters], codec = blob_compressor.compress(
+        [pickle.dumps(layout), pickle.dumps(search_filters)]
+    )
 
     identifier = generate_parse_id()
 
     new_result = StoredLayout(
         parse_id=identifier,
         timestamp=datetime.now(),
-        layout=pickled_layout,
+        layout=layout_store.put(pickled_layout),
         search_filters=pickled_search_filters,
+        search_key=search_key,
+        codec=codec,
+        **(metadata.to_columns() if metadata is not None else {}),
     )
-    db.session.add(new_result)
-    db.session.commit()
+    write_queue.submit(db, lambda session: session.add(new_result)).result()
 
     log.debug("Search result stored in DB")
 
@@ -0,0 +1,148 @@
+import os
+import time
+
+from flask import Flask
+from flask_socketio import SocketIO
+from flask_sqlalchemy import SQLAlchemy
+
+from vulcan.file_loader import BasicLayout
+from vulcan.search.inner_search_layer import InvalidSearchArguments
+
+from logger import log
+from services.search import handle_search
+
+# Number of searches that can run at the same time. Further searches wait in a queue.
+SEARCH_WORKERS = int(os.environ.get("VULCAN_SEARCH_WORKERS", 2))
+
+# Minimum number of seconds between two search_progress events of a job.
+PROGRESS_EVENT_INTERVAL = 0.25
+
+
+class SearchCancelled(Exception):
+    """
+    Raised inside a search job when the job has been cancelled.
+    """
+
+    pass
+
+
+class SearchJob:
+    def __init__(self, sid: str, search_data: dict, socketio: SocketIO):
+        self.sid = sid
+        self.search_data = search_data
+        self.cancelled = False
+        self._socketio = socketio
+        self._last_progress_event = 0.0
+
+    def report_progress(self, scanned: int, matched: int, total: int) -> None:
+        """
+        Progress callback of the search. Yields to other tasks, so that a
+        long search does not block other clients, and aborts the search if the
+        job has been cancelled in the meantime.
+        """
+        self._socketio.sleep(0)
+        if self.cancelled:
+            raise SearchCancelled()
+
+        now = time.monotonic()
+        if now - self._last_progress_event >= PROGRESS_EVENT_INTERVAL:
+            self._last_progress_event = now
+            self._socketio.emit(
+                "search_progress",
+                {"scanned": scanned, "matched": matched, "total": total},
+                to=self.sid,
+            )
+
+
+class SearchJobs:
+    """
+    Runs searches as background jobs on a fixed pool of worker tasks, so that
+    a slow search does not stall the event handlers of other clients. Each
+    client has at most one search job: starting a new search cancels the
+    previous one.
+    """
+
+    def __init__(
+        self,
+        socketio: SocketIO,
+        app: Flask,
+        db: SQLAlchemy,
+        standard_layout: BasicLayout,
+        workers: int = SEARCH_WORKERS,
+    ):
+        self.socketio = socketio
+        self.app = app
+        self.db = db
+        self.standard_layout = standard_layout
+        self.workers = workers
+        self._jobs: dict[str, SearchJob] = {}
+        self._queue = None
+
+    def start(self, sid: str, search_data: dict) -> None:
+        if self._queue is None:
+            self._start_workers()
+        self.cancel(sid)
+        job = SearchJob(sid, search_data, self.socketio)
+        self._jobs[sid] = job
+        self._queue.put(job)
+
+    def cancel(self, sid: str) -> bool:
+        """
+        Cancel the search job of a client, if it has one. Returns whether a
+        job was cancelled.
+        """
+        job = self._jobs.pop(sid, None)
+        if job is not None:
+            log.debug(f"Cancelling search for {sid}.")
+            job.cancelled = True
+        return job is not None
+
+    def _start_workers(self) -> None:
+        # Queues of the server's async mode, so that waiting workers do not
+        # block the event loop.
+        self._queue = self.socketio.server.eio.create_queue()
+        for _ in range(self.workers):
+            self.socketio.start_background_task(self._work)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job.cancelled:
+                continue
+            with self.app.app_context():
+                self._run(job)
+            if self._jobs.get(job.sid) is job:
+                del self._jobs[job.sid]
+
+    def _run(self, job: SearchJob) -> None:
+        try:
+            result_identifier = self._search(job)
+        except SearchCancelled:
+            log.debug("Search cancelled.")
+            return
+        except InvalidSearchArguments as e:
+            log.info(f"Invalid search arguments: {e}")
+            self.socketio.emit("search_error", {"message": str(e)}, to=job.sid)
+            return
+        except Exception as e:
+            log.exception(e)
+            self.socketio.emit("server_error", to=job.sid)
+            return
+
+        if job.cancelled:
+            return
+        log.debug("Search successful. Rerouting to result.")
+        self.socketio.emit("route_to_layout", result_identifier, to=job.sid)
+
+    def _search(self, job: SearchJob) -> str:
+        while True:
+            try:
+                return handle_search(
+                    self.db, job.search_data, self.standard_layout, job.report_progress
+                )
+            except SearchCancelled:
+                if job.cancelled:
+                    raise
+                # We waited for an identical search of another client, which
+                # was cancelled. Run the search ourselves.
+                log.debug("Shared search was cancelled. Retrying.")
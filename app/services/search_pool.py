@@ -0,0 +1,169 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable
+
+from vulcan.file_loader import BasicLayout, create_layout_from_filepath
+from vulcan.search.search import (
+    CompiledSearchFilter,
+    find_matches_in_layout,
+    SearchFilter,
+)
+
+from logger import log
+
+# Number of worker processes that searches are split across. 0 runs searches
+# in the server process.
+SEARCH_PROCESSES = int(os.environ.get("VULCAN_SEARCH_PROCESSES", 0))
+
+# Number of shards per worker process. More shards balance the load better
+# when matches are unevenly distributed over the corpus.
+SHARDS_PER_PROCESS = 4
+
+# Corpora smaller than this are not split into more than one shard.
+MIN_SHARD_SIZE = 1000
+
+# Number of seconds between two checks for finished shards.
+POLL_INTERVAL = 0.05
+
+# The standard layout of a worker process, loaded once when the process starts.
+_worker_layout: BasicLayout | None = None
+
+
+def _load_worker_layout(layout_path: str) -> None:
+    global _worker_layout
+    _worker_layout = create_layout_from_filepath(
+        input_path=layout_path,
+        is_json_file=False,
+        propbank_path=None,
+    )
+
+
+def _search_shard(
+    search_filters: list[SearchFilter], start: int, stop: int
+) -> tuple[list[int], list[dict]]:
+    return find_matches_in_layout(
+        _worker_layout, search_filters, instance_range=(start, stop)
+    )
+
+
+class SearchPool:
+    """
+    Splits searches on the standard layout into shards of consecutive
+    instances and runs the shards in a pool of worker processes, so that a
+    search on a large corpus uses more than one CPU core.
+
+    Each worker process loads the standard layout once when it starts, so only
+    the search filters and the matches are sent between processes.
+    """
+
+    def __init__(self):
+        self.processes = 0
+        self.corpus_size = 0
+        self.sleep: Callable[[float], Any] = time.sleep
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    def start(
+        self,
+        layout_path: str,
+        corpus_size: int,
+        processes: int = SEARCH_PROCESSES,
+        sleep: Callable[[float], Any] = time.sleep,
+    ) -> None:
+        """
+        Start the worker processes. `sleep` is used to wait for the shards of a
+        search, and can be replaced by the sleep of the async mode the server
+        runs in, so that waiting does not block other tasks.
+        """
+        if processes <= 0:
+            return
+        log.info(f"Starting {processes} search processes...")
+        self.processes = processes
+        self.corpus_size = corpus_size
+        self.sleep = sleep
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            # Forking a server with running threads is unsafe.
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_worker_layout,
+            initargs=(layout_path,),
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def find_matches(
+        self,
+        search_filters: list[SearchFilter],
+        progress: Callable[[int, int, int], None] | None = None,
+    ) -> tuple[list[int], list[dict]]:
+        """
+        Same result as find_matches_in_layout on the standard layout.
+
+        If given, progress is called while waiting for the shards, with the
+        number of instances in finished shards, the number of matches in them
+        and the corpus size. If it raises an exception, the shards that have
+        not started yet are cancelled and the exception is passed on.
+        """
+        # Invalid user arguments are reported once, before any shard runs.
+        for search_filter in search_filters:
+            CompiledSearchFilter(search_filter)
+
+        shards = self._get_shards()
+        futures: dict[Future, int] = {
+            self._executor.submit(_search_shard, search_filters, start, stop): position
+            for position, (start, stop) in enumerate(shards)
+        }
+        results: list[tuple[list[int], list[dict]] | None] = [None] * len(shards)
+        scanned = 0
+        matched = 0
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    position = futures[future]
+                    results[position] = future.result()
+                    start, stop = shards[position]
+                    scanned += stop - start
+                    matched += len(results[position][0])
+                if progress is not None:
+                    progress(scanned, matched, self.corpus_size)
+                if pending and not done:
+                    self.sleep(POLL_INTERVAL)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+        matching_indices = []
+        highlight_dicts = []
+        for shard_indices, shard_highlight_dicts in results:
+            matching_indices.extend(shard_indices)
+            highlight_dicts.extend(shard_highlight_dicts)
+        return matching_indices, highlight_dicts
+
+    def _get_shards(self) -> list[tuple[int, int]]:
+        shard_count = max(
+            1,
+            min(
+                self.processes * SHARDS_PER_PROCESS,
+                self.corpus_size // MIN_SHARD_SIZE,
+            ),
+        )
+        shard_size = -(-self.corpus_size // shard_count)
+        return [
+            (start, min(start + shard_size, self.corpus_size))
+            for start in range(0, max(self.corpus_size, 1), shard_size or 1)
+        ]
+
+
+# Shared by all searches. Disabled until started by the app.
+search_pool = SearchPool()
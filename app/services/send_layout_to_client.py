@@ -1,35 +1,172 @@
+import json
+from typing import Any, Callable
+
 from flask_socketio import emit
 
 from vulcan.data_handling.data_corpus import CorpusSlice
 from vulcan.file_loader import BasicLayout
-from vulcan.search.search import create_list_of_possible_search_filters, SearchFilter
+from vulcan.search.search import (
+    create_list_of_possible_search_filters_for_slices,
+    SearchFilter,
+)
 
 from .server_methods import instance_requested
 from logger import log
+from services.payload_cache import Payload
+from utils.lru_cache import LRUCache
+from utils.raw_json import RawJSON
+
+# Number of layout schemas whose encoded handshake events are cached.
+HANDSHAKE_CACHE_SIZE = 128
+
+# Layout schema -> encoded events that only depend on the schema.
+_handshake_cache: LRUCache[tuple, list[Payload]] = LRUCache(HANDSHAKE_CACHE_SIZE)
+
+
+class LayoutMetadata:
+    """
+    What a client is sent on connect besides the instances: the slices of the
+    layout by row (as sent in set_layout), the corpus size and the serialized
+    active search filters.
+
+    Stored layouts keep their metadata in columns of their StoredLayout row,
+    so that the handshake can be sent without unpickling the layout.
+    """
+
+    def __init__(
+        self,
+        schema: list[list[dict[str, str]]],
+        corpus_size: int,
+        active_filters: list[dict[str, Any]],
+    ):
+        self.schema = schema
+        self.corpus_size = corpus_size
+        self.active_filters = active_filters
+
+    @staticmethod
+    def from_layout(
+        layout: BasicLayout, active_search_filters: list[SearchFilter] | None = None
+    ) -> "LayoutMetadata":
+        return LayoutMetadata(
+            make_layout_sendable(layout),
+            layout.corpus_size,
+            [
+                search_filter.serialize()
+                for search_filter in active_search_filters or []
+            ],
+        )
+
+    @staticmethod
+    def from_columns(
+        layout_schema: str | None,
+        corpus_size: int | None,
+        active_filters: str | None,
+    ) -> "LayoutMetadata | None":
+        """
+        Read the metadata from the columns written by to_columns. Returns None
+        if they are missing, e.g. for layouts stored by an older version.
+        """
+        if layout_schema is None or corpus_size is None:
+            return None
+        return LayoutMetadata(
+            json.loads(layout_schema),
+            corpus_size,
+            json.loads(active_filters) if active_filters else [],
+        )
+
+    def to_columns(self) -> dict[str, Any]:
+        """
+        The values of the metadata columns of a StoredLayout.
+        """
+        return {
+            "layout_schema": json.dumps(self.schema, separators=(",", ":")),
+            "corpus_size": self.corpus_size,
+            "active_filters": json.dumps(self.active_filters, separators=(",", ":")),
+        }
+
+    def get_schema_key(self) -> tuple:
+        """
+        The names and visualization types of the slices, by row.
+        """
+        return tuple(
+            tuple(
+                (corpus_slice["name"], corpus_slice["visualization_type"])
+                for corpus_slice in row
+            )
+            for row in self.schema
+        )
 
 
 def send_layout_to_client(
-    sid: str, layout: BasicLayout, active_search_filters: list[SearchFilter]
-) -> None:
+    sid: str,
+    metadata: LayoutMetadata,
+    load_layout: Callable[[], BasicLayout | None],
+) -> BasicLayout | None:
+    """
+    Send the handshake of a layout, followed by its first instance and the
+    active search filters. The handshake is sent from the metadata alone;
+    load_layout is only called to send the first instance.
+
+    Returns the loaded layout, or None if it could not be loaded.
+    """
     try:
-        emit("set_layout", make_layout_sendable(layout), to=sid)
-        emit("set_corpus_length", layout.corpus_size, to=sid)
-        emit("set_show_node_names", {"show_node_names": False}, to=sid)
-        emit(
-            "set_search_filters",
-            create_list_of_possible_search_filters(layout),
-            to=sid,
-        )
-        instance_requested(sid, layout, 0)
+        for event, payload in get_layout_payloads(metadata):
+            emit(event, payload, to=sid)
 
-        serialized_filters = [
-            filter.serialize() for filter in active_search_filters
-        ]
+        layout = load_layout()
+        if layout is None:
+            emit("server_error", to=sid)
+            return None
+        instance_requested(sid, layout, 0)
 
-        emit("activate_search_filters", serialized_filters, to=sid)
+        emit("activate_search_filters", metadata.active_filters, to=sid)
+        return layout
     except Exception as e:
         log.exception(e)
         emit("server_error", to=sid)
+        return None
+
+
+def build_layout_events(metadata: LayoutMetadata) -> list[tuple[str, Any]]:
+    """
+    Build the events that describe a layout to a client, in the order in
+    which they are sent on connect.
+    """
+    return [
+        ("set_layout", metadata.schema),
+        ("set_corpus_length", metadata.corpus_size),
+        ("set_show_node_names", {"show_node_names": False}),
+        (
+            "set_search_filters",
+            create_list_of_possible_search_filters_for_slices(
+                [key for row in metadata.get_schema_key() for key in row]
+            ),
+        ),
+    ]
+
+
+def get_layout_payloads(metadata: LayoutMetadata) -> list[Payload]:
+    """
+    Return the encoded events of build_layout_events. All events except the
+    corpus length only depend on the schema of the layout (see
+    LayoutMetadata.get_schema_key), so they are encoded once per schema and
+    cached.
+    """
+    schema = metadata.get_schema_key()
+    schema_payloads = _handshake_cache.get(schema)
+    if schema_payloads is None:
+        schema_payloads = [
+            (event, RawJSON.encode(data))
+            for event, data in build_layout_events(metadata)
+            if event != "set_corpus_length"
+        ]
+        _handshake_cache.put(schema, schema_payloads)
+
+    return [
+        schema_payloads[0],
+        ("set_corpus_length", RawJSON.encode(metadata.corpus_size)),
+        *schema_payloads[1:],
+    ]
 
 
 # The following two methods are copied from vulcan.server.server, but
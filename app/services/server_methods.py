@@ -17,17 +17,26 @@
 # We cannot import from vulcan.server.server directly, since it crashes the app.
 
 
+import json
+from contextlib import AbstractContextManager, nullcontext
 from typing import Any
 
 from flask_socketio import emit
 
 from logger import log
+from services.client_capabilities import client_capabilities
+from services.payload_cache import payload_cache, Payload
+from utils.raw_json import RawJSON
 
 from vulcan.data_handling.visualization_type import VisualizationType
 from vulcan.server.basic_layout import BasicLayout
 from vulcan.search.search import SearchFilter
 
 
+# Maximum number of instances sent for one instances_requested event.
+MAX_INSTANCES_PER_REQUEST = 100
+
+
 def cell_coordinates_to_cell_name(row: int, column: int) -> str:
     return f"({row}, {column})"
 
@@ -123,74 +132,16 @@ def instance_requested(sid: str, layout: BasicLayout, data: Any):
     try:
         if layout.corpus_size > 0:
             instance_id = data
-            for row in layout.layout:
-                for corpus_slice in row:
-                    if corpus_slice.label_alternatives is not None:
-                        label_alternatives_by_node_name = (
-                            corpus_slice.label_alternatives[instance_id]
-                        )
-                    else:
-                        label_alternatives_by_node_name = None
-
-                    if corpus_slice.highlights is not None:
-                        highlights = corpus_slice.highlights[instance_id]
-                    else:
-                        highlights = None
-
-                    if corpus_slice.mouseover_texts is not None:
-                        mouseover_texts = corpus_slice.mouseover_texts[instance_id]
-                    else:
-                        mouseover_texts = None
-
-                    if corpus_slice.dependency_trees is not None:
-                        dependency_tree = corpus_slice.dependency_trees[instance_id]
-                    else:
-                        dependency_tree = None
-
-                    if corpus_slice.visualization_type == VisualizationType.STRING:
-                        send_data = send_string(
-                            corpus_slice.name,
-                            corpus_slice.instances[instance_id],
-                            label_alternatives_by_node_name,
-                            highlights,
-                            dependency_tree,
-                        )
-                        emit("set_table", send_data, to=sid)
-                    elif corpus_slice.visualization_type == VisualizationType.TABLE:
-                        send_data = send_string_table(
-                            corpus_slice.name,
-                            corpus_slice.instances[instance_id],
-                            label_alternatives_by_node_name,
-                            highlights,
-                            dependency_tree,
-                        )
-                        emit("set_table", send_data, to=sid)
-                    elif corpus_slice.visualization_type == VisualizationType.TREE:
-                        # trees are just graphs without reentrancies
-                        send_data = send_graph(
-                            corpus_slice.name,
-                            corpus_slice.instances[instance_id],
-                            label_alternatives_by_node_name,
-                            highlights,
-                        )
-                        emit("set_graph", send_data, to=sid)
-                    elif corpus_slice.visualization_type == VisualizationType.GRAPH:
-                        send_data = send_graph(
-                            corpus_slice.name,
-                            corpus_slice.instances[instance_id],
-                            label_alternatives_by_node_name,
-                            highlights,
-                            mouseover_texts,
-                        )
-                        emit("set_graph", send_data, to=sid)
-            for linker in layout.linkers:
-                sent_data = send_linker(
-                    linker["name1"],
-                    linker["name2"],
-                    layout,
-                    linker["scores"][instance_id],
+            payloads = get_instance_payloads(layout, instance_id)
+            if client_capabilities.has(sid, "set_instance"):
+                emit(
+                    "set_instance",
+                    bundle_instance_payloads(instance_id, payloads),
+                    to=sid,
                 )
-                emit("set_linker", sent_data, to=sid)
+            else:
+                for event, payload in payloads:
+                    emit(event, payload, to=sid)
         else:
             print("No instances in corpus")
     except Exception as e:
@@ -198,6 +149,190 @@ def instance_requested(sid: str, layout: BasicLayout, data: Any):
         emit("server_error", to=sid)
 
 
+def get_instance_payloads(layout: BasicLayout, instance_id: int) -> list[Payload]:
+    """
+    Return the encoded events that show an instance of the layout, from the
+    payload cache if possible.
+    """
+    payloads = payload_cache.get(layout, instance_id)
+    if payloads is None:
+        payloads = encode_instance_events(layout, instance_id)
+        payload_cache.put(layout, instance_id, payloads)
+    return payloads
+
+
+def encode_instance_events(
+    layout: BasicLayout, instance_id: int, slice_names: set[str] | None = None
+) -> list[Payload]:
+    """
+    Build the events that show an instance of the layout (see
+    build_instance_events) and encode them, without using the payload cache.
+    """
+    return [
+        (event, RawJSON.encode(send_data))
+        for event, send_data in build_instance_events(
+            layout, instance_id, slice_names
+        )
+    ]
+
+
+def instances_requested(
+    sid: str, layout: BasicLayout, start: Any, count: Any, slices: Any = None
+):
+    """
+    Send the instances start, ..., start + count - 1 of the layout (as far as
+    they exist) in one set_instances event: {"start": ..., "instances": [...]},
+    where each instance has the format of a set_instance event. If slices is a
+    list of slice names, only the events of these slices and of the linkers
+    between them are sent.
+    """
+    try:
+        if not isinstance(start, int) or not isinstance(count, int):
+            raise ValueError(f"Invalid instance range: {start}, {count}")
+        if slices is not None and not isinstance(slices, list):
+            raise ValueError(f"Invalid slice names: {slices}")
+        stop = min(start + min(count, MAX_INSTANCES_PER_REQUEST), layout.corpus_size)
+        slice_names = set(slices) if slices is not None else None
+
+        bundles = []
+        with preloaded_instances(layout, start, stop):
+            for instance_id in range(max(start, 0), stop):
+                if slice_names is None:
+                    payloads = get_instance_payloads(layout, instance_id)
+                else:
+                    payloads = encode_instance_events(layout, instance_id, slice_names)
+                bundles.append(
+                    bundle_instance_payloads(instance_id, payloads).encoded
+                )
+        emit(
+            "set_instances",
+            RawJSON(
+                f'{{"start":{json.dumps(start)},"instances":[{",".join(bundles)}]}}'
+            ),
+            to=sid,
+        )
+    except Exception as e:
+        log.exception(e)
+        emit("server_error", to=sid)
+
+
+def preloaded_instances(
+    layout: BasicLayout, start: int, stop: int
+) -> AbstractContextManager:
+    """
+    Context in which the instances start, ..., stop - 1 of the layout stay
+    loaded, if the layout is a stored parse whose instances are loaded from
+    the database on demand (see services.stored_instances.LoadedInstances).
+    They are then loaded with a single query, instead of one per instance.
+    """
+    for row in layout.layout:
+        for corpus_slice in row:
+            preloaded = getattr(corpus_slice.instances, "preloaded", None)
+            if preloaded is not None:
+                return preloaded(start, stop)
+    return nullcontext()
+
+
+def bundle_instance_payloads(instance_id: int, payloads: list[Payload]) -> RawJSON:
+    """
+    Combine the encoded events of an instance into the argument of a single
+    set_instance event: {"index": ..., "events": [[event, data], ...]}, with
+    the events in the order in which they would have been sent separately.
+    """
+    events = ",".join(
+        f"[{json.dumps(event)},{payload.encoded}]" for event, payload in payloads
+    )
+    return RawJSON(f'{{"index":{json.dumps(instance_id)},"events":[{events}]}}')
+
+
+def build_instance_events(
+    layout: BasicLayout, instance_id: int, slice_names: set[str] | None = None
+) -> list[tuple[str, dict]]:
+    """
+    Build the set_table, set_graph and set_linker events that show an
+    instance of the layout, in the order in which they are sent.
+
+    If slice_names is given, only the events of these slices, and of the
+    linkers between them, are built.
+    """
+    events = []
+    for row in layout.layout:
+        for corpus_slice in row:
+            if slice_names is not None and corpus_slice.name not in slice_names:
+                continue
+            if corpus_slice.label_alternatives is not None:
+                label_alternatives_by_node_name = corpus_slice.label_alternatives[
+                    instance_id
+                ]
+            else:
+                label_alternatives_by_node_name = None
+
+            if corpus_slice.highlights is not None:
+                highlights = corpus_slice.highlights[instance_id]
+            else:
+                highlights = None
+
+            if corpus_slice.mouseover_texts is not None:
+                mouseover_texts = corpus_slice.mouseover_texts[instance_id]
+            else:
+                mouseover_texts = None
+
+            if corpus_slice.dependency_trees is not None:
+                dependency_tree = corpus_slice.dependency_trees[instance_id]
+            else:
+                dependency_tree = None
+
+            if corpus_slice.visualization_type == VisualizationType.STRING:
+                send_data = send_string(
+                    corpus_slice.name,
+                    corpus_slice.instances[instance_id],
+                    label_alternatives_by_node_name,
+                    highlights,
+                    dependency_tree,
+                )
+                events.append(("set_table", send_data))
+            elif corpus_slice.visualization_type == VisualizationType.TABLE:
+                send_data = send_string_table(
+                    corpus_slice.name,
+                    corpus_slice.instances[instance_id],
+                    label_alternatives_by_node_name,
+                    highlights,
+                    dependency_tree,
+                )
+                events.append(("set_table", send_data))
+            elif corpus_slice.visualization_type == VisualizationType.TREE:
+                # trees are just graphs without reentrancies
+                send_data = send_graph(
+                    corpus_slice.name,
+                    corpus_slice.instances[instance_id],
+                    label_alternatives_by_node_name,
+                    highlights,
+                )
+                events.append(("set_graph", send_data))
+            elif corpus_slice.visualization_type == VisualizationType.GRAPH:
+                send_data = send_graph(
+                    corpus_slice.name,
+                    corpus_slice.instances[instance_id],
+                    label_alternatives_by_node_name,
+                    highlights,
+                    mouseover_texts,
+                )
+                events.append(("set_graph", send_data))
+    for linker in layout.linkers:
+        if slice_names is not None and not (
+            linker["name1"] in slice_names and linker["name2"] in slice_names
+        ):
+            continue
+        sent_data = send_linker(
+            linker["name1"],
+            linker["name2"],
+            layout,
+            linker["scores"][instance_id],
+        )
+        events.append(("set_linker", sent_data))
+    return events
+
+
 def get_search_filters_from_data(data) -> list[SearchFilter]:
     search_filters = []
     for search_filter_data in data:
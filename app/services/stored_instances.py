@@ -0,0 +1,388 @@
+import pickle
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from typing import Any, Callable
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, undefer
+
+from vulcan.data_handling.data_corpus import CorpusSlice
+from vulcan.data_handling.visualization_type import VisualizationType
+from vulcan.file_loader import BasicLayout
+
+from db.compression import blob_compressor
+from db.layout_store import layout_store
+from db.models import StoredInstance, StoredLayout
+from services.prefetch import PREFETCH_WINDOW
+from services.send_layout_to_client import LayoutMetadata
+from utils.lru_cache import LRUCache
+from utils.write_queue import write_queue
+
+# The per-instance fields of a corpus slice, besides the instances themselves.
+SLICE_FIELDS = [
+    "label_alternatives",
+    "highlights",
+    "mouseover_texts",
+    "dependency_trees",
+]
+
+# Number of decoded instances that are kept per layout: an instance and the
+# neighbours that are prefetched around it. Sending an instance reads all
+# fields of all slices of the same instance.
+LOADED_INSTANCES_PER_LAYOUT = 2 * PREFETCH_WINDOW + 1
+
+
+class LayoutSkeleton:
+    """
+    The metadata of a stored parse whose instances are stored in separate
+    StoredInstance rows: the names, visualization types and available fields
+    of its slices, the names of its linkers and the corpus size. Serving an
+    instance then only reads and unpickles the row of that instance, instead
+    of the whole layout.
+
+    A LayoutSkeleton must be resolved before it can be sent to the client.
+    """
+
+    def __init__(
+        self,
+        slices: list[tuple[str, VisualizationType, list[str]]],
+        linkers: list[tuple[str, str]],
+        corpus_size: int,
+    ):
+        # (name, visualization type, fields that are not None) of each slice
+        self.slices = slices
+        self.linkers = linkers
+        self.corpus_size = corpus_size
+
+    @staticmethod
+    def from_layout(layout: BasicLayout) -> "LayoutSkeleton":
+        return LayoutSkeleton(
+            [
+                (
+                    corpus_slice.name,
+                    corpus_slice.visualization_type,
+                    [
+                        field
+                        for field in SLICE_FIELDS
+                        if getattr(corpus_slice, field) is not None
+                    ],
+                )
+                for row in layout.layout
+                for corpus_slice in row
+            ],
+            [(linker["name1"], linker["name2"]) for linker in layout.linkers],
+            layout.corpus_size,
+        )
+
+    def resolve(
+        self,
+        load_instance: Callable[[int], bytes | None],
+        load_instances: Callable[[int, int], dict[int, bytes]],
+    ) -> BasicLayout:
+        """
+        Create a BasicLayout whose instances are loaded lazily.
+
+        :param load_instance: Returns the data of the instance with the given
+         index, as stored by store_layout_instances, or None if it is missing.
+        :param load_instances: Returns the data of the instances start, ...,
+         stop - 1 that exist, by index.
+        """
+        instances = LoadedInstances(load_instance, load_instances, self.corpus_size)
+        slices = [
+            CorpusSlice(
+                name,
+                StoredSliceField(instances, name, "instances"),
+                visualization_type,
+                **{
+                    field: StoredSliceField(instances, name, field)
+                    for field in fields
+                },
+            )
+            for name, visualization_type, fields in self.slices
+        ]
+        linkers = [
+            {
+                "name1": name1,
+                "name2": name2,
+                "scores": StoredLinkerScores(instances, linker_index),
+            }
+            for linker_index, (name1, name2) in enumerate(self.linkers)
+        ]
+        return BasicLayout(slices, linkers, self.corpus_size)
+
+
+def get_instance_data(layout: BasicLayout, index: int) -> dict[str, Any]:
+    """
+    The data of one instance of a layout, in the format of StoredInstance rows.
+    """
+    return {
+        "slices": {
+            corpus_slice.name: {
+                field: getattr(corpus_slice, field)[index]
+                for field in ["instances", *SLICE_FIELDS]
+                if getattr(corpus_slice, field) is not None
+            }
+            for row in layout.layout
+            for corpus_slice in row
+        },
+        "linkers": [linker["scores"][index] for linker in layout.linkers],
+    }
+
+
+def store_layout_instances(
+    db: SQLAlchemy, parse_id: str, layout: BasicLayout, **stored_layout_columns
+) -> None:
+    """
+    Store a layout as a StoredLayout row with its LayoutSkeleton and metadata,
+    and one StoredInstance row per instance.
+
+    The rows are committed by the write queue. Returns once they have been
+    committed.
+    """
+    [pickled_skeleton], codec = blob_compressor.compress(
+        [pickle.dumps(LayoutSkeleton.from_layout(layout))]
+    )
+    stored_layout = StoredLayout(
+        parse_id=parse_id,
+        timestamp=datetime.now(),
+        layout=layout_store.put(pickled_skeleton),
+        codec=codec,
+        **LayoutMetadata.from_layout(layout).to_columns(),
+        **stored_layout_columns,
+    )
+    instance_rows = []
+    for index in range(layout.corpus_size):
+        [data], codec = blob_compressor.compress(
+            [pickle.dumps(get_instance_data(layout, index))]
+        )
+        instance_rows.append(
+            {
+                "parse_id": parse_id,
+                "instance_index": index,
+                "data": layout_store.put(data),
+                "codec": codec,
+            }
+        )
+
+    def write(session: Session) -> None:
+        session.add(stored_layout)
+        if instance_rows:
+            session.execute(insert(StoredInstance), instance_rows)
+
+    write_queue.submit(db, write).result()
+
+
+def reuse_stored_layout(db: SQLAlchemy, parse_id: str, content_hash: str) -> bool:
+    """
+    Store a parse whose parse results have been uploaded before, by adding a
+    StoredLayout row that shares the layout and instances of the earlier
+    upload. Returns False if there is no earlier upload with the same content
+    hash.
+
+    The earlier upload is looked up in the same transaction in which the row
+    is added, so it cannot be removed in between.
+    """
+
+    def write(session: Session) -> bool:
+        original = (
+            session.query(StoredLayout)
+            .options(undefer(StoredLayout.layout))
+            .filter_by(content_hash=content_hash)
+            .order_by(StoredLayout.id)
+            .first()
+        )
+        if original is None:
+            return False
+        session.add(
+            StoredLayout(
+                parse_id=parse_id,
+                timestamp=datetime.now(),
+                layout=original.layout,
+                codec=original.codec,
+                layout_schema=original.layout_schema,
+                corpus_size=original.corpus_size,
+                active_filters=original.active_filters,
+                content_hash=content_hash,
+                instances_parse_id=get_instances_parse_id(original),
+            )
+        )
+        return True
+
+    return write_queue.submit(db, write).result()
+
+
+def get_instances_parse_id(stored_layout: StoredLayout) -> str:
+    """
+    The parse ID that the StoredInstance rows of a stored layout are stored
+    under.
+    """
+    return stored_layout.instances_parse_id or stored_layout.parse_id
+
+
+def load_stored_instance(db: SQLAlchemy, parse_id: str, index: int) -> bytes | None:
+    row = (
+        db.session.query(StoredInstance.data, StoredInstance.codec)
+        .filter_by(parse_id=parse_id, instance_index=index)
+        .one_or_none()
+    )
+    if row is None:
+        return None
+    return blob_compressor.decompress(db, layout_store.get(row.data), row.codec)
+
+
+def load_stored_instances(
+    db: SQLAlchemy, parse_id: str, start: int, stop: int
+) -> dict[int, bytes]:
+    """
+    Load the instances start, ..., stop - 1 of a stored parse with a single
+    query. Returns the data of the instances that exist, by index.
+    """
+    if start >= stop:
+        return {}
+    rows = (
+        db.session.query(
+            StoredInstance.instance_index, StoredInstance.data, StoredInstance.codec
+        )
+        .filter(
+            StoredInstance.parse_id == parse_id,
+            StoredInstance.instance_index.between(start, stop - 1),
+        )
+        .all()
+    )
+    return {
+        row.instance_index: blob_compressor.decompress(
+            db, layout_store.get(row.data), row.codec
+        )
+        for row in rows
+    }
+
+
+def get_instance_samples(layout: BasicLayout, count: int) -> list[bytes]:
+    """
+    The pickled data of evenly spaced instances of a layout, in the format of
+    StoredInstance rows, e.g. to train a compression dictionary on.
+    """
+    step = max(layout.corpus_size // count, 1)
+    return [
+        pickle.dumps(get_instance_data(layout, index))
+        for index in range(0, layout.corpus_size, step)[:count]
+    ]
+
+
+class LoadedInstances:
+    """
+    Loads and unpickles the instances of a stored parse on demand, and keeps
+    the most recently used ones.
+
+    Code that reads a range of instances (e.g. to send them in one event, or
+    to prefetch them) loads the range with a single query first, see
+    preloaded().
+    """
+
+    def __init__(
+        self,
+        load_instance: Callable[[int], bytes | None],
+        load_instances: Callable[[int, int], dict[int, bytes]],
+        corpus_size: int,
+    ):
+        self.load_instance = load_instance
+        self.load_instances = load_instances
+        self.corpus_size = corpus_size
+        self._loaded: LRUCache[int, dict[str, Any]] = LRUCache(
+            LOADED_INSTANCES_PER_LAYOUT
+        )
+        # index -> (data, number of active preloaded() contexts that hold it)
+        self._pinned: dict[int, tuple[dict[str, Any], int]] = {}
+        self._lock = Lock()
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        if index < 0:
+            index += self.corpus_size
+        if not 0 <= index < self.corpus_size:
+            raise IndexError(f"Instance index out of range: {index}")
+
+        with self._lock:
+            pinned = self._pinned.get(index)
+        if pinned is not None:
+            return pinned[0]
+        data = self._loaded.get(index)
+        if data is not None:
+            return data
+
+        stored_data = self.load_instance(index)
+        if stored_data is None:
+            raise LookupError(f"Instance {index} is missing from the database.")
+        data = pickle.loads(stored_data)
+
+        self._loaded.put(index, data)
+        return data
+
+    @contextmanager
+    def preloaded(self, start: int, stop: int) -> Iterator[None]:
+        """
+        Load the instances start, ..., stop - 1 with a single query, and keep
+        them loaded while the context is active, regardless of the number of
+        instances that are kept otherwise.
+        """
+        start, stop = max(start, 0), min(stop, self.corpus_size)
+        loaded = {
+            index: pickle.loads(stored_data)
+            for index, stored_data in self.load_instances(start, stop).items()
+        }
+        with self._lock:
+            for index, data in loaded.items():
+                data, count = self._pinned.get(index, (data, 0))
+                self._pinned[index] = (data, count + 1)
+        try:
+            yield
+        finally:
+            with self._lock:
+                for index in loaded:
+                    data, count = self._pinned.pop(index)
+                    if count > 1:
+                        self._pinned[index] = (data, count - 1)
+            for index, data in loaded.items():
+                self._loaded.put(index, data)
+
+
+class StoredSliceField(Sequence):
+    """
+    Read-only sequence of one field (e.g. the instances or the highlights) of
+    a corpus slice of a stored parse.
+    """
+
+    def __init__(self, instances: LoadedInstances, slice_name: str, field: str):
+        self.instances = instances
+        self.slice_name = slice_name
+        self.field = field
+
+    def __getitem__(self, index: int) -> Any:
+        return self.instances[index]["slices"][self.slice_name][self.field]
+
+    def __len__(self) -> int:
+        return self.instances.corpus_size
+
+    def preloaded(self, start: int, stop: int):
+        """
+        See LoadedInstances.preloaded.
+        """
+        return self.instances.preloaded(start, stop)
+
+
+class StoredLinkerScores(Sequence):
+    """
+    Read-only sequence of the scores of a linker of a stored parse.
+    """
+
+    def __init__(self, instances: LoadedInstances, linker_index: int):
+        self.instances = instances
+        self.linker_index = linker_index
+
+    def __getitem__(self, index: int) -> Any:
+        return self.instances[index]["linkers"][self.linker_index]
+
+    def __len__(self) -> int:
+        return self.instances.corpus_size
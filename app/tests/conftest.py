@@ -0,0 +1,20 @@
+import pytest
+from flask import Flask
+
+from db.models import configure_sqlite, db as _db
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    The database of a bare app (without the standard layout and background
+    tasks of create_app) in a temporary file, with an active app context.
+    """
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    _db.init_app(app)
+    with app.app_context():
+        configure_sqlite(_db)
+        _db.create_all()
+        yield _db
+        _db.session.remove()
@@ -0,0 +1,75 @@
+import pytest
+
+from db import compression
+from db.compression import BlobCompressor, zstd
+from db.models import CompressionDictionary
+
+BLOBS = [b"", b"x", b"some text " * 100, bytes(range(256)) * 4]
+SAMPLES = [
+    f'{{"label": "node {i}", "children": [{i % 7}, {i % 13}], "id": {i * 31}}}'.encode()
+    for i in range(2000)
+]
+
+CODECS = [
+    "zlib",
+    pytest.param(
+        "zstd",
+        marks=pytest.mark.skipif(zstd is None, reason="compression.zstd is missing"),
+    ),
+]
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip_without_dictionary(db, codec):
+    compressor = BlobCompressor()
+    compressor.start(db, lambda: [], codec)
+
+    compressed, stored_codec = compressor.compress(BLOBS)
+
+    assert stored_codec == codec
+    assert [compressor.decompress(db, blob, stored_codec) for blob in compressed] == BLOBS
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip_with_dictionary(db, codec, monkeypatch):
+    # the samples are too few for a dictionary of the default size
+    monkeypatch.setattr(compression, "ZSTD_DICTIONARY_SIZE", 4 * 1024)
+    compressor = BlobCompressor()
+    compressor.start(db, lambda: SAMPLES, codec)
+    dictionary = db.session.query(CompressionDictionary).filter_by(codec=codec).one()
+
+    compressed, stored_codec = compressor.compress(BLOBS + SAMPLES[:3])
+
+    assert stored_codec == f"{codec}:{dictionary.id}"
+    # a new process only knows the dictionary from the database
+    assert [
+        BlobCompressor().decompress(db, blob, stored_codec) for blob in compressed
+    ] == BLOBS + SAMPLES[:3]
+
+
+def test_stored_dictionary_is_reused(db):
+    BlobCompressor().start(db, lambda: SAMPLES, "zlib")
+    compressor = BlobCompressor()
+    compressor.start(db, lambda: pytest.fail("trained a second dictionary"), "zlib")
+
+    assert db.session.query(CompressionDictionary).count() == 1
+    assert compressor.compress([b"x"])[1] == f"zlib:{compressor.dictionary_id}"
+
+
+def test_rows_without_codec_are_not_compressed(db):
+    compressor = BlobCompressor()
+    compressor.start(db, lambda: SAMPLES, "zlib")
+
+    assert compressor.decompress(db, b"legacy blob", None) == b"legacy blob"
+
+
+def test_compression_can_be_disabled(db):
+    compressor = BlobCompressor()
+    compressor.start(db, lambda: SAMPLES, "none")
+
+    assert compressor.compress(BLOBS) == (BLOBS, None)
+
+
+def test_missing_dictionary(db):
+    with pytest.raises(LookupError):
+        BlobCompressor().decompress(db, b"", "zlib:42")
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+
+from db import layout_store as layout_store_module
+from db.layout_store import InMemoryLayoutStore, SQLiteLayoutStore
+from db.models import StoredInstance, StoredLayout
+
+
+def _add_layout(db, parse_id: str, layout: bytes, instances: list[bytes]) -> None:
+    db.session.add(
+        StoredLayout(parse_id=parse_id, timestamp=datetime.now(), layout=layout)
+    )
+    for index, data in enumerate(instances):
+        db.session.add(
+            StoredInstance(parse_id=parse_id, instance_index=index, data=data)
+        )
+    db.session.commit()
+
+
+def test_identical_blobs_are_stored_once():
+    store = InMemoryLayoutStore()
+
+    reference = store.put(b"layout")
+
+    assert store.put(b"layout") == reference
+    assert store.get(reference) == b"layout"
+    assert len(store._list_blobs()) == 1
+
+
+def test_remove_unreferenced(db, monkeypatch):
+    store = InMemoryLayoutStore()
+    layout = store.put(b"layout")
+    shared_instance = store.put(b"instance")
+    orphaned = store.put(b"orphaned")
+    _add_layout(db, "a", layout, [shared_instance, b"inline instance"])
+    _add_layout(db, "b", b"inline layout", [shared_instance])
+
+    # blobs are young, so nothing is removed yet
+    assert store.remove_unreferenced(db) == 0
+
+    monkeypatch.setattr(layout_store_module, "UNREFERENCED_BLOB_MIN_AGE", -1)
+    assert store.remove_unreferenced(db) == 1
+
+    assert store.get(layout) == b"layout"
+    assert store.get(shared_instance) == b"instance"
+    with pytest.raises(LookupError):
+        store.get(orphaned)
+
+    db.session.query(StoredInstance).filter_by(parse_id="a").delete()
+    db.session.query(StoredLayout).filter_by(parse_id="a").delete()
+    db.session.commit()
+    assert store.remove_unreferenced(db) == 1
+
+    assert store.get(shared_instance) == b"instance"
+    with pytest.raises(LookupError):
+        store.get(layout)
+
+
+def test_sqlite_store_cannot_read_references():
+    with pytest.raises(LookupError):
+        SQLiteLayoutStore().get(InMemoryLayoutStore().put(b"layout"))
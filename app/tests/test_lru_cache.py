@@ -0,0 +1,75 @@
+from utils.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used_entries_first():
+    cache = LRUCache(max_size=3)
+    for key in "abc":
+        cache.put(key, key.upper())
+
+    assert cache.get("a") == "A"
+    cache.put("d", "D")
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicts_by_size():
+    cache = LRUCache(max_size=10)
+    cache.put("a", "A", size=4)
+    cache.put("b", "B", size=4)
+    cache.put("c", "C", size=6)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "B"
+    assert cache.get("c") == "C"
+    assert cache.stats()["size"] == 10
+
+    cache.put("d", "D", size=9)
+
+    assert [cache.get(key) for key in "bcd"] == [None, None, "D"]
+    assert cache.stats()["evictions"] == 3
+
+
+def test_replacing_an_entry_updates_its_size():
+    cache = LRUCache(max_size=10)
+    cache.put("a", "A", size=8)
+    cache.put("a", "A2", size=2)
+    cache.put("b", "B", size=8)
+
+    assert cache.get("a") == "A2"
+    assert len(cache) == 2
+    assert cache.stats()["size"] == 10
+
+
+def test_entries_larger_than_the_cache_are_not_stored():
+    cache = LRUCache(max_size=10)
+    cache.put("a", "A", size=5)
+    cache.put("big", "BIG", size=11)
+
+    assert cache.get("big") is None
+    assert cache.get("a") == "A"
+
+
+def test_size_zero_disables_the_cache():
+    cache = LRUCache(max_size=0)
+    cache.put("a", "A")
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUCache(max_size=2)
+    cache.put("a", "A")
+    cache.get("a")
+    cache.get("b")
+
+    assert cache.stats() == {
+        "entries": 1,
+        "size": 1,
+        "max_size": 2,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+    }
@@ -0,0 +1,49 @@
+import re
+
+import pytest
+
+from vulcan.search.regex_literals import get_required_literals
+
+
+@pytest.mark.parametrize("pattern, literals", [
+    ("prince", ["prince"]),
+    ("abc?de", ["ab", "de"]),
+    ("sheep?", ["shee"]),
+    ("(ab)c", ["abc"]),
+    ("(?:gre)+at", ["gre", "at"]),
+    ("bao.{2}ab", ["bao", "ab"]),
+    (r"\w+ly", ["ly"]),
+    (r"\.txt", [".txt"]),
+    # alternation
+    ("little|prince", []),
+    ("(ab|cd)e", ["e"]),
+    ("abc|abd", ["ab"]),
+    # character classes
+    ("[Tt]he", ["he"]),
+    ("(ab|cd)e[fg]h", ["e", "h"]),
+    ("a[b]c", ["abc"]),
+    # repeats that may match nothing
+    ("ab{0,3}cd", ["a", "cd"]),
+    ("a(?:bc){0,2}d", ["a", "d"]),
+    ("ab*c", ["a", "c"]),
+    # case-insensitive patterns and groups with flags
+    ("(?i)the", []),
+    ("x(?i:ab)cd", ["x", "cd"]),
+    ("a(?s:.)b", ["a", "b"]),
+    # invalid patterns
+    ("(", []),
+])
+def test_required_literals(pattern, literals):
+    assert get_required_literals(pattern) == literals
+
+
+@pytest.mark.parametrize("pattern", [
+    "abc?de", "(ab|cd)e[fg]h", "ab{0,3}cd", "x(?i:ab)cd", "(?:gre)+at", r"\w+ly", "abc|abd",
+])
+def test_required_literals_occur_in_every_match(pattern):
+    strings = ["abde", "abcde", "cdefh", "abegh", "acd", "abbbcd", "xABcd", "xabcd", "greatly", "gregreat", "only",
+               "abc", "abd", "ab", "de"]
+    literals = get_required_literals(pattern)
+    for string in strings:
+        if re.search(pattern, string):
+            assert all(literal in string for literal in literals), string
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.models import StoredInstance, StoredLayout
+from services.stored_instances import reuse_stored_layout, store_layout_instances
+from utils.timestamps import EXPIRATION_TIME_DAYS, remove_old_layouts
+from vulcan.data_handling.data_corpus import from_dict_list
+from vulcan.server.basic_layout import BasicLayout
+
+CONTENT_HASH = "0" * 64
+
+
+@pytest.fixture
+def layout() -> BasicLayout:
+    corpus = from_dict_list(
+        [
+            {
+                "name": "Sentence",
+                "format": "tokenized_string",
+                "instances": [["a", "b"], ["c"], ["d", "e", "f"]],
+            }
+        ]
+    )
+    return BasicLayout(corpus.slices.values(), corpus.linkers, corpus.size)
+
+
+def _expire(db, parse_id: str) -> None:
+    db.session.query(StoredLayout).filter_by(parse_id=parse_id).update(
+        {"timestamp": datetime.now() - timedelta(days=EXPIRATION_TIME_DAYS + 1)}
+    )
+    db.session.commit()
+
+
+def _count_instances(db) -> int:
+    return db.session.query(StoredInstance).filter_by(parse_id="original").count()
+
+
+@pytest.mark.parametrize(
+    "first_expired, last_expired", [("original", "copy"), ("copy", "original")]
+)
+def test_shared_instances_are_kept_until_the_last_layout_expires(
+    db, layout, first_expired, last_expired
+):
+    store_layout_instances(db, "original", layout, content_hash=CONTENT_HASH)
+    assert reuse_stored_layout(db, "copy", CONTENT_HASH)
+    assert _count_instances(db) == 3
+
+    _expire(db, first_expired)
+    remove_old_layouts(db)
+
+    assert [parse_id for (parse_id,) in db.session.query(StoredLayout.parse_id)] == [
+        last_expired
+    ]
+    assert _count_instances(db) == 3
+
+    _expire(db, last_expired)
+    remove_old_layouts(db)
+
+    assert db.session.query(StoredLayout).count() == 0
+    assert _count_instances(db) == 0
+
+
+def test_instances_of_unshared_layouts_are_removed(db, layout):
+    store_layout_instances(db, "original", layout, content_hash=CONTENT_HASH)
+    store_layout_instances(db, "other", layout)
+
+    _expire(db, "original")
+    remove_old_layouts(db)
+
+    assert _count_instances(db) == 0
+    assert db.session.query(StoredInstance).filter_by(parse_id="other").count() == 3
@@ -0,0 +1,147 @@
+import pytest
+
+from vulcan.data_handling.data_corpus import from_dict_list
+from vulcan.file_loader import create_layout_from_filepath
+from vulcan.search import search
+from vulcan.search.search import SearchFilter, find_matches_in_layout, _bitmap_to_indices, _get_list_to_search, \
+    _indices_to_bitmap, _search_lists
+from vulcan.search.search_index import INDEXED_OUTER_SEARCH_LAYERS
+from vulcan.search.search_progress import SEARCH_PROGRESS_INTERVAL
+from vulcan.server.basic_layout import BasicLayout
+
+
+@pytest.fixture(scope="module")
+def little_prince() -> BasicLayout:
+    return create_layout_from_filepath("little_prince_simple.pickle")
+
+
+@pytest.fixture(scope="module")
+def tables(little_prince) -> BasicLayout:
+    sentences = _get_list_to_search(little_prince, "Sentence")[:300]
+    tags = [["X" if len(token) < 4 else "LONG" for token in sentence] for sentence in sentences]
+    corpus = from_dict_list([
+        {"name": "Sentence", "format": "tokenized_string", "instances": sentences},
+        {"name": "Tagging", "format": "object_table",
+         "instances": [[[("token", token) for token in sentence], [("token", tag) for tag in sentence_tags]]
+                       for sentence, sentence_tags in zip(sentences, tags)]},
+        {"name": "Raw", "format": "string_table",
+         "instances": [[list(sentence), sentence_tags] for sentence, sentence_tags in zip(sentences, tags)]},
+    ])
+    return BasicLayout(corpus.slices.values(), corpus.linkers, corpus.size)
+
+
+def _filter(corpus_slice_name, outer_search_layer_name, inner_search_layer_names, inner_search_layer_arguments,
+            color="red"):
+    return SearchFilter(corpus_slice_name, outer_search_layer_name, inner_search_layer_names,
+                        inner_search_layer_arguments, color)
+
+
+def _scan(layout, filters, instance_range=None):
+    lists_to_search = [_get_list_to_search(layout, f.corpus_slice_name) for f in filters]
+    return _search_lists(lists_to_search, filters, instance_range=instance_range)
+
+
+@pytest.mark.parametrize("indices", [
+    [],
+    [0],
+    [7],
+    [8],
+    [0, 1, 2, 3, 4, 5, 6, 7, 8],
+    [3, 64, 65, 1000],
+    list(range(0, 5000, 3)),
+])
+def test_bitmap_round_trip(indices):
+    bitmap = _indices_to_bitmap(indices)
+    assert bitmap == sum(1 << index for index in indices)
+    assert _bitmap_to_indices(bitmap) == indices
+
+
+def test_bitmap_from_unsorted_indices_with_duplicates():
+    assert _bitmap_to_indices(_indices_to_bitmap([9, 2, 9, 0, 2])) == [0, 2, 9]
+
+
+LITTLE_PRINCE_FILTERS = [
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals"], [["the"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals"], [[" The "]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals"], [["zzz"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals", "TokenContentMatches"], [["the"], ["T"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentMatches"], [["pr.*"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentMatches"], [["(?i)the"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentMatches"], [["little|prince"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentMatches"], [["[Tt]he"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentMatches"], [["sh(?:ee){0,1}p"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentMatches"], [[r"\w+ly"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentMatches"], [[""]])],
+    [_filter("Gold graph", "OuterGraphNodeLayer", ["NodeContentEquals"], [["prince"]])],
+    [_filter("Gold graph", "OuterGraphNodeLayer", ["NodeContentEquals", "HasAtLeastXOutgoingEdges"],
+             [["prince"], ["1"]])],
+    [_filter("Gold graph", "OuterGraphNodeLayer", ["HasAtLeastXOutgoingEdges"], [["3"]])],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals"], [["the"]]),
+     _filter("Gold graph", "OuterGraphNodeLayer", ["NodeContentEquals"], [["prince"]], "blue")],
+    [_filter("Gold graph", "OuterGraphNodeLayer", ["HasAtLeastXOutgoingEdges"], [["2"]], "blue"),
+     _filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals"], [["the"]]),
+     _filter("Predicted graph", "OuterGraphNodeLayer", ["NodeContentEquals"], [["i"]], "green")],
+    [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals"], [["the"]]),
+     _filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals"], [["the"]], "green")],
+]
+
+
+@pytest.mark.parametrize("filters", LITTLE_PRINCE_FILTERS)
+def test_indexed_search_matches_scan(little_prince, filters):
+    assert find_matches_in_layout(little_prince, filters) == _scan(little_prince, filters)
+
+
+@pytest.mark.parametrize("filters", LITTLE_PRINCE_FILTERS)
+def test_indexed_search_matches_scan_in_instance_range(little_prince, filters):
+    instance_range = (100, 700)
+    assert find_matches_in_layout(little_prince, filters, instance_range=instance_range) \
+        == _scan(little_prince, filters, instance_range)
+
+
+TABLE_FILTERS = [
+    [_filter("Tagging", "OuterTableCellsLayer", ["CellContentEquals"], [["long"]])],
+    [_filter("Raw", "OuterTableCellsLayer", ["CellContentEquals"], [["prince"]])],
+    [_filter("Raw", "OuterTableCellsLayer", ["CellContentMatches"], [["ONG"]])],
+    [_filter("Raw", "OuterTableCellsLayer", ["CellContentMatches"], [["^pr(in|et)"]])],
+    [_filter("Raw", "OuterTableCellsLayer", ["CellContentEquals"], [["LONG"]]),
+     _filter("Sentence", "OuterStringTokensLayer", ["TokenContentEquals"], [["the"]], "blue")],
+    [_filter("Raw", "OuterTableAsAWholeLayer", ["ColumnCountAtLeast"], [["10"]]),
+     _filter("Tagging", "OuterTableCellsLayer", ["CellContentEquals"], [["x"]], "green")],
+]
+
+
+@pytest.mark.parametrize("filters", TABLE_FILTERS)
+def test_indexed_table_search_matches_scan(tables, filters):
+    assert find_matches_in_layout(tables, filters) == _scan(tables, filters)
+
+
+def test_progress_gap_is_bounded(monkeypatch):
+    # every instance matches, so both naming the element-store matches and collecting the highlights take one step
+    # per instance after the store is built
+    corpus = from_dict_list([{"name": "Sentence", "format": "tokenized_string",
+                              "instances": [[f"w{i}"] for i in range(10 * SEARCH_PROGRESS_INTERVAL)]}])
+    layout = BasicLayout(corpus.slices.values(), corpus.linkers, corpus.size)
+    steps = 0
+    gaps = []
+
+    def counting(function):
+        def counted(*args, **kwargs):
+            nonlocal steps
+            steps += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def progress(scanned, matched, total):
+        nonlocal steps
+        gaps.append(steps)
+        steps = 0
+
+    indexed_layer = INDEXED_OUTER_SEARCH_LAYERS["OuterStringTokensLayer"]
+    monkeypatch.setattr(indexed_layer, "get_elements", counting(indexed_layer.get_elements))
+    monkeypatch.setattr(search, "_add_highlight_color", counting(search._add_highlight_color))
+
+    filters = [_filter("Sentence", "OuterStringTokensLayer", ["TokenContentMatches"], [[".*"]])]
+    matching_indices, _ = find_matches_in_layout(layout, filters, progress=progress)
+
+    assert len(matching_indices) == 10 * SEARCH_PROGRESS_INTERVAL
+    assert max(gaps + [steps]) <= 2 * SEARCH_PROGRESS_INTERVAL
@@ -0,0 +1,90 @@
+import time
+from threading import Event, Thread
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+WAITERS = 4
+
+
+class _WaitedEvent(Event):
+    """
+    Event that counts the callers that wait for it.
+    """
+
+    waiting = 0
+
+    def wait(self, timeout=None):
+        _WaitedEvent.waiting += 1
+        return super().wait(timeout)
+
+
+@pytest.fixture
+def single_flight() -> SingleFlight:
+    _WaitedEvent.waiting = 0
+    return SingleFlight(create_event=_WaitedEvent)
+
+
+def _wait_for_waiters():
+    deadline = time.time() + 5
+    while _WaitedEvent.waiting < WAITERS:
+        assert time.time() < deadline, "callers did not wait for the running call"
+        time.sleep(0.01)
+
+
+def _call_concurrently(single_flight: SingleFlight, key: str, function) -> list:
+    """
+    Call function through the single flight from WAITERS + 1 threads. Returns
+    the result or the exception of each call.
+    """
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(single_flight.do(key, function))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [Thread(target=call) for _ in range(WAITERS + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return outcomes
+
+
+def test_concurrent_callers_share_one_call(single_flight):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        _wait_for_waiters()
+        return "result"
+
+    assert _call_concurrently(single_flight, "key", compute) == ["result"] * (
+        WAITERS + 1
+    )
+    assert len(calls) == 1
+
+
+def test_error_reaches_every_caller(single_flight):
+    error = ValueError("failed")
+    calls = []
+
+    def fail():
+        calls.append(1)
+        _wait_for_waiters()
+        raise error
+
+    assert _call_concurrently(single_flight, "key", fail) == [error] * (WAITERS + 1)
+    assert len(calls) == 1
+
+
+def test_later_calls_compute_again(single_flight):
+    assert single_flight.do("key", lambda: 1) == 1
+    assert single_flight.do("key", lambda: 2) == 2
+
+
+def test_different_keys_do_not_wait_for_each_other(single_flight):
+    assert single_flight.do("a", lambda: single_flight.do("b", lambda: "b")) == "b"
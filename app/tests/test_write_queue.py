@@ -0,0 +1,90 @@
+from datetime import datetime
+from threading import Event
+
+import pytest
+from flask import current_app
+from flask_socketio import SocketIO
+from sqlalchemy.exc import IntegrityError
+
+from db.models import StoredLayout
+from utils.write_queue import WriteQueue
+
+
+@pytest.fixture
+def write_queue(db) -> WriteQueue:
+    socketio = SocketIO(async_mode="threading")
+    app = current_app._get_current_object()
+    socketio.init_app(app)
+    write_queue = WriteQueue()
+    write_queue.start(socketio, app, db)
+    return write_queue
+
+
+def _add_layout(parse_id: str):
+    def write(session):
+        session.add(
+            StoredLayout(parse_id=parse_id, timestamp=datetime.now(), layout=b"")
+        )
+        return parse_id
+
+    return write
+
+
+def _submit_batch(db, write_queue: WriteQueue, writes):
+    """
+    Submit writes so that they are committed in one batch, by holding up the
+    writer with a first write until all of them are queued.
+    """
+    started, release = Event(), Event()
+
+    def hold_up(session):
+        started.set()
+        release.wait()
+
+    write_queue.submit(db, hold_up)
+    started.wait()
+    futures = [write_queue.submit(db, write) for write in writes]
+    release.set()
+    return futures
+
+
+def _stored_parse_ids(db) -> list[str]:
+    db.session.rollback()
+    return sorted(parse_id for (parse_id,) in db.session.query(StoredLayout.parse_id))
+
+
+def test_queued_writes_are_committed_in_one_batch(db, write_queue):
+    futures = _submit_batch(db, write_queue, [_add_layout(str(i)) for i in range(3)])
+
+    assert [future.result() for future in futures] == ["0", "1", "2"]
+    assert _stored_parse_ids(db) == ["0", "1", "2"]
+    # the write that held up the writer, and the batch of the others
+    assert write_queue.stats()["batches"] == 2
+    assert write_queue.stats()["writes"] == 4
+
+
+def test_writes_of_a_failed_batch_are_retried_one_by_one(db, write_queue):
+    write_queue.submit(db, _add_layout("taken")).result()
+
+    futures = _submit_batch(
+        db, write_queue, [_add_layout("a"), _add_layout("taken"), _add_layout("b")]
+    )
+
+    assert futures[0].result() == "a"
+    with pytest.raises(IntegrityError):
+        futures[1].result()
+    assert futures[2].result() == "b"
+    assert _stored_parse_ids(db) == ["a", "b", "taken"]
+    # the first write, the write that held up the writer, and the two writes
+    # that succeeded on their own
+    assert write_queue.stats()["batches"] == 4
+
+
+def test_writes_are_committed_immediately_until_the_queue_is_started(db):
+    write_queue = WriteQueue()
+
+    future = write_queue.submit(db, _add_layout("a"))
+
+    assert future.done()
+    assert future.result() == "a"
+    assert _stored_parse_ids(db) == ["a"]
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Generic, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Thread-safe bounded in-memory cache that evicts the least recently used
+    entries first.
+
+    Each entry has a size, and entries are evicted as soon as the total size
+    exceeds max_size. With the default size of 1 per entry, the cache holds
+    at most max_size entries. Caches that are bounded by memory pass the size
+    of each entry in bytes instead. Entries that are larger than max_size are
+    not cached, so a max_size of 0 disables the cache.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.current_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: K) -> V | None:
+        """
+        Return the cached value for a key, or None if it is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: K, value: V, size: int = 1) -> None:
+        """
+        Add a value to the cache, evicting the least recently used entries if
+        the cache is full.
+        """
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.current_size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.current_size += size
+
+            while self.current_size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_size -= evicted_size
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Counters that can be used to size the cache.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size": self.current_size,
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
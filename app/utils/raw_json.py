@@ -0,0 +1,47 @@
+"""
+JSON module for Socket.IO that can send pre-encoded JSON.
+
+Event arguments wrapped in RawJSON are written into the packet as they are,
+instead of being encoded again. Everything else is encoded with the standard
+json module, so this module can be passed as `json` to SocketIO.
+"""
+
+import json
+from typing import Any
+
+loads = json.loads
+
+
+class RawJSON:
+    """
+    An event argument that has already been encoded as JSON.
+    """
+
+    __slots__ = ("encoded",)
+
+    def __init__(self, encoded: str):
+        self.encoded = encoded
+
+    @staticmethod
+    def encode(data: Any) -> "RawJSON":
+        # Same separators as the Socket.IO packet encoder.
+        return RawJSON(json.dumps(data, separators=(",", ":")))
+
+    def __len__(self) -> int:
+        return len(self.encoded)
+
+
+def dumps(obj: Any, **kwargs) -> str:
+    # Socket.IO encodes the event name and its arguments as one list.
+    if isinstance(obj, list) and any(isinstance(item, RawJSON) for item in obj):
+        return (
+            "["
+            + ",".join(
+                item.encoded
+                if isinstance(item, RawJSON)
+                else json.dumps(item, **kwargs)
+                for item in obj
+            )
+            + "]"
+        )
+    return json.dumps(obj, **kwargs)
@@ -0,0 +1,50 @@
+from threading import Event, Lock
+from typing import Any, Callable
+
+
+class _Call:
+    def __init__(self, event):
+        self.event = event
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls with the same key: while a call for a key is
+    in progress, other callers with the same key wait for it to finish and
+    share its result (or its exception) instead of doing the work themselves.
+
+    `create_event` creates the event that waiting callers block on. It can be
+    replaced by an event factory of the async mode the server runs in.
+    """
+
+    def __init__(self, create_event: Callable[[], Any] = Event):
+        self.create_event = create_event
+        self._calls: dict[str, _Call] = {}
+        self._lock = Lock()
+
+    def do(self, key: str, function: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call(self.create_event())
+                self._calls[key] = call
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
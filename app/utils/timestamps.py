@@ -1,28 +1,103 @@
+import os
 from datetime import timedelta, datetime
+from threading import Lock
 
+from flask import Flask
+from flask_socketio import SocketIO
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, or_, update
 
-from db.models import StoredLayout
+from db.layout_store import layout_store
+from db.models import StoredInstance, StoredLayout
 from logger import log
+from utils.write_queue import write_queue
 
 # Number of days before a layout expires.
 EXPIRATION_TIME_DAYS = 90
 
+# Number of seconds between writes of the access times of stored layouts to
+# the database.
+TIMESTAMP_FLUSH_INTERVAL = int(os.environ.get("VULCAN_TIMESTAMP_FLUSH_INTERVAL", 60))
 
-def update_timestamp(db: SQLAlchemy, stored_layout: StoredLayout) -> None:
+
+class TouchTable:
     """
-    Updates the timestamp of a StoredLayout object to the current time.
+    Keeps the time at which stored layouts were last accessed in memory, and
+    writes them to the timestamps of their StoredLayout rows in one
+    transaction per flush, rather than committing on every access.
+
+    Timestamps in the database therefore lag behind by at most the flush
+    interval, which remove_old_layouts allows for.
     """
-    log.debug(f"Updating timestamp for layout {stored_layout.id}")
 
-    new_timestamp = datetime.now()
+    def __init__(self):
+        # parse_id -> time of the last access that has not been written yet
+        self._touched: dict[str, datetime] = {}
+        self._lock = Lock()
 
-    stored_layout.timestamp = new_timestamp
-    log.debug(
-        f"Updated timestamp for layout: {stored_layout.id} ({stored_layout.timestamp})"
-    )
+    def touch(self, parse_id: str) -> None:
+        with self._lock:
+            self._touched[parse_id] = datetime.now()
 
-    db.session.commit()
+    def flush(self, db: SQLAlchemy) -> int:
+        """
+        Write the recorded access times to the database. Returns the number of
+        layouts whose timestamp was updated.
+        """
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return 0
+
+        table = StoredLayout.__table__
+        statement = (
+            update(table)
+            .where(table.c.parse_id == bindparam("touched_parse_id"))
+            .values(timestamp=bindparam("touched_at"))
+        )
+        rows = [
+            {"touched_parse_id": parse_id, "touched_at": timestamp}
+            for parse_id, timestamp in touched.items()
+        ]
+        try:
+            write_queue.submit(
+                db, lambda session: session.execute(statement, rows)
+            ).result()
+        except Exception:
+            # Keep the access times for the next flush, unless the layout has
+            # been accessed again in the meantime.
+            with self._lock:
+                for parse_id, timestamp in touched.items():
+                    self._touched.setdefault(parse_id, timestamp)
+            raise
+
+        log.debug(f"Updated timestamps of {len(touched)} layouts")
+        return len(touched)
+
+    def start_flushing(
+        self,
+        socketio: SocketIO,
+        app: Flask,
+        db: SQLAlchemy,
+        interval: int = TIMESTAMP_FLUSH_INTERVAL,
+    ) -> None:
+        """
+        Flush the access times every interval seconds in a background task.
+        """
+
+        def flush_periodically():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    with app.app_context():
+                        self.flush(db)
+                except Exception as e:
+                    log.exception(e)
+
+        socketio.start_background_task(flush_periodically)
+
+
+touch_table = TouchTable()
 
 
 def remove_old_layouts(db: SQLAlchemy) -> None:
@@ -31,7 +106,12 @@ def remove_old_layouts(db: SQLAlchemy) -> None:
     """
     log.debug("Removing old layouts")
 
-    oldest_allowed_timestamp = datetime.now() - timedelta(days=EXPIRATION_TIME_DAYS)
+    # This usually runs in a separate process (see remove_old_layouts.py),
+    # which cannot see the access times that the server has not written yet.
+    # They are at most one flush interval newer than the stored timestamps.
+    oldest_allowed_timestamp = datetime.now() - timedelta(
+        days=EXPIRATION_TIME_DAYS, seconds=TIMESTAMP_FLUSH_INTERVAL
+    )
 
     old_layouts = (
         db.session.query(StoredLayout)
@@ -43,6 +123,32 @@ def remove_old_layouts(db: SQLAlchemy) -> None:
         log.debug(f"Deleting layout: {layout.id} ({layout.timestamp})")
         db.session.delete(layout)
 
+    # Remove the instances of layouts that are stored per instance, unless
+    # they are shared with a layout that is kept (identical uploads share
+    # their instances). The layouts that share them are counted after the
+    # old layouts have been deleted.
+    instances_parse_ids = {
+        layout.instances_parse_id or layout.parse_id for layout in old_layouts
+    }
+    remaining_layouts = db.session.query(
+        StoredLayout.parse_id, StoredLayout.instances_parse_id
+    ).filter(
+        or_(
+            StoredLayout.instances_parse_id.in_(instances_parse_ids),
+            StoredLayout.parse_id.in_(instances_parse_ids),
+        )
+    )
+    shared_parse_ids = {
+        instances_parse_id or parse_id
+        for parse_id, instances_parse_id in remaining_layouts
+    }
+    db.session.query(StoredInstance).filter(
+        StoredInstance.parse_id.in_(instances_parse_ids - shared_parse_ids)
+    ).delete(synchronize_session=False)
+
     db.session.commit()
 
+    # Blobs that are kept outside of the database are removed separately.
+    layout_store.remove_unreferenced(db)
+
     log.debug("Old layouts removed")
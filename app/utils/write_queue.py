@@ -0,0 +1,145 @@
+import os
+from threading import Event
+from typing import Any, Callable
+
+from flask import Flask
+from flask_socketio import SocketIO
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import Session
+
+from logger import log
+
+# Maximum number of queued writes that are committed in one transaction.
+WRITE_BATCH_SIZE = int(os.environ.get("VULCAN_WRITE_BATCH_SIZE", 64))
+
+# A write adds or updates rows in the given session, without committing.
+Write = Callable[[Session], Any]
+
+
+class WriteFuture:
+    """
+    The outcome of a queued write: its return value once it has been
+    committed, or the exception that made it fail.
+    """
+
+    def __init__(self, event):
+        self._event = event
+        self._result = None
+        self._error: BaseException | None = None
+
+    def done(self) -> bool:
+        return self._event.is_set()
+
+    def result(self) -> Any:
+        """
+        Wait until the write has been committed and return its return value.
+        Raises the exception of the write if it failed.
+        """
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _set_result(self, result: Any) -> None:
+        self._result = result
+        self._event.set()
+
+    def _set_error(self, error: BaseException) -> None:
+        self._error = error
+        self._event.set()
+
+
+class WriteQueue:
+    """
+    Funnels all writes to the database through a single writer task, so that
+    writes do not contend for SQLite's write lock.
+
+    The writer takes all writes that are waiting in the queue (up to the batch
+    size) and commits them in one transaction. If the transaction fails, each
+    write of the batch is retried in its own transaction, so that one failing
+    write does not fail the others.
+
+    Until the queue is started (e.g. in scripts that do not run the server),
+    writes are committed immediately by the caller.
+    """
+
+    def __init__(self):
+        # Committed transactions and the writes in them
+        self.batches = 0
+        self.writes = 0
+        self._queue = None
+
+    def start(
+        self,
+        socketio: SocketIO,
+        app: Flask,
+        db: SQLAlchemy,
+        batch_size: int = WRITE_BATCH_SIZE,
+    ) -> None:
+        self.socketio = socketio
+        self.app = app
+        self.db = db
+        self.batch_size = max(batch_size, 1)
+        # Queue and events of the server's async mode, so that waiting for
+        # a write does not block the event loop.
+        self._queue = socketio.server.eio.create_queue()
+        self._queue_empty = socketio.server.eio.get_queue_empty_exception()
+        self._create_event = socketio.server.eio.create_event
+        socketio.start_background_task(self._work)
+
+    def submit(self, db: SQLAlchemy, write: Write) -> WriteFuture:
+        """
+        Queue a write. The write is called in the writer task, so it must not
+        use objects of the caller's session.
+        """
+        if self._queue is None:
+            future = WriteFuture(Event())
+            self._commit_batch(db, [(write, future)])
+            return future
+
+        future = WriteFuture(self._create_event())
+        self._queue.put((write, future))
+        return future
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "writes": self.writes,
+        }
+
+    def _work(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except self._queue_empty:
+                    break
+            with self.app.app_context():
+                self._commit_batch(self.db, batch)
+
+    def _commit_batch(
+        self, db: SQLAlchemy, batch: list[tuple[Write, WriteFuture]]
+    ) -> None:
+        try:
+            results = [write(db.session) for write, _ in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                log.exception(e)
+                batch[0][1]._set_error(e)
+                return
+            log.debug("Batch of writes failed. Retrying them one by one.")
+            for write, future in batch:
+                self._commit_batch(db, [(write, future)])
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        for (_, future), result in zip(batch, results):
+            future._set_result(result)
+
+
+write_queue = WriteQueue()
@@ -1,4 +1,11 @@
-const sio = io();
+// The stored parse or search result that the page shows (?id=...), or null for the standard layout.
+const layout_id = new URLSearchParams(window.location.search).get("id")
+// Announce that we handle the bundled set_instance and the prefetch_instance events.
+const sio_query = {capabilities: "set_instance,prefetch"}
+if (layout_id !== null) {
+    sio_query["id"] = layout_id
+}
+const sio = io({query: sio_query});
 // sio.eio.pingTimeout = 120000; // 2 minutes
 // sio.eio.pingInterval = 20000;  // 20 seconds
 
@@ -138,14 +145,14 @@ function create_canvas(width_percent, height_percent, name="", only_horizontal_z
 d3.select("#previousButton")
     .on("click", function() {
         if (set_corpus_position(current_corpus_position - 1)) {
-            sio.emit("instance_requested", current_corpus_position);
+            show_instance(current_corpus_position);
         }
     });
 
 d3.select("#nextButton")
     .on("click", function() {
         if (set_corpus_position(current_corpus_position + 1)) {
-            sio.emit("instance_requested", current_corpus_position);
+            show_instance(current_corpus_position);
         } else {
             // console.log("no more instances");
             // console.log(corpus_length)
@@ -164,6 +171,7 @@ d3.select("#clearSearchButton")
 
 sio.on('connect', () => {
     console.log('connected');
+    prefetched_instances.clear()
     initializeSearchFilters()
 });
 
@@ -171,6 +179,80 @@ sio.on('disconnect', () => {
   console.log('disconnected');
 });
 
+// Instances the server pushed ahead of navigation, by index.
+let prefetched_instances = new Map()
+// Number of instances the server pushes on each side of the shown one (sent by the server on connect).
+let prefetch_window = 0
+
+function dispatch_instance_events(data) {
+    // dispatch the bundled events to their usual handlers, in order
+    for (const [event, payload] of data["events"]) {
+        for (const listener of sio.listeners(event)) {
+            listener(payload)
+        }
+    }
+}
+
+function instance_url(index) {
+    if (layout_id === null) {
+        return "/standard/instance/" + index
+    }
+    return "/layout/" + encodeURIComponent(layout_id) + "/instance/" + index
+}
+
+// Fetch an instance over HTTP, so that the browser and reverse proxies can cache it. Falls back to requesting it
+// over the socket if the HTTP request fails.
+function fetch_instance(index) {
+    fetch(instance_url(index))
+        .then((response) => {
+            if (!response.ok) {
+                throw new Error("HTTP status " + response.status)
+            }
+            return response.json()
+        })
+        .then((data) => {
+            // ignore the response if the user has moved on in the meantime
+            if (index == current_corpus_position) {
+                dispatch_instance_events(data)
+            }
+        })
+        .catch((error) => {
+            console.log("Fetching instance " + index + " failed (" + error + "), requesting it over the socket.")
+            if (index == current_corpus_position) {
+                sio.emit("instance_requested", index)
+            }
+        })
+}
+
+function show_instance(index) {
+    let prefetched = prefetched_instances.get(index)
+    if (prefetched !== undefined) {
+        dispatch_instance_events(prefetched)
+    } else {
+        fetch_instance(index)
+    }
+    // let the server push the instances around this one
+    sio.emit("prefetch_requested", index)
+    // keep one more instance on each side, so that stepping back does not need a request
+    for (const prefetched_index of prefetched_instances.keys()) {
+        if (Math.abs(prefetched_index - index) > prefetch_window + 1) {
+            prefetched_instances.delete(prefetched_index)
+        }
+    }
+}
+
+sio.on("set_instance", (data) => {
+    dispatch_instance_events(data)
+})
+
+sio.on("prefetch_instance", (data) => {
+    prefetched_instances.set(data["index"], data)
+})
+
+sio.on("set_prefetch_window", (data) => {
+    prefetch_window = data
+})
+
 sio.on('set_show_node_names', (data) => {
     add_node_name_to_node_label = data["show_node_names"]
 })
@@ -404,11 +486,13 @@ sio.on("set_corpus_length", (data) => {
 })
 
 sio.on("search_completed", (data) => {
+    prefetched_instances.clear()
     set_corpus_position(0)
     sio.emit("instance_requested", current_corpus_position);
 })
 
 sio.on("refresh_to_position_zero", (data) => {
+    prefetched_instances.clear()
     set_corpus_position(0)
     sio.emit("instance_requested", current_corpus_position);
 })
@@ -421,6 +505,14 @@ sio.on("server_error", (data) => {
     alert("Error on the server side. If you experience issues, please try reloading the page.")
 })
 
+sio.on("search_progress", (data) => {
+    console.log("Searching: " + data["scanned"] + "/" + data["total"] + " scanned, " + data["matched"] + " matches")
+})
+
+sio.on("search_error", (data) => {
+    alert("Invalid search: " + data["message"])
+})
+
 function remove_graphs_from_canvas(canvas) {
     canvas.selectAll("."+NODE_CLASSNAME+", ."+BACKGROUND_CLASSNAME+", ."+EDGE_CLASSNAME).remove()
 }
@@ -478,7 +570,7 @@ d3.select("#corpusPositionInput").on("keypress", function() {
     if (d3.event.keyCode == 13) {
         let new_position = parseInt(d3.select("#corpusPositionInput").property("value")) - 1
         if (set_corpus_position(new_position)) {
-            sio.emit("instance_requested", current_corpus_position)
+            show_instance(current_corpus_position)
         } else {
             d3.select("#corpusPositionText").text("/" + corpus_length + " Error: invalid position requested")
         }
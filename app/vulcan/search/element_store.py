@@ -0,0 +1,151 @@
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from vulcan.search.search_progress import SEARCH_PROGRESS_INTERVAL, SearchProgress
+
+
+class ElementStore:
+    """
+    Columnar copy of the elements (tokens or table cells) of a corpus slice. Each distinct element is stored once in
+    a vocabulary, and the slice is stored as one flat array with the vocabulary id of every element, plus the offset
+    of each instance's elements in that array. For each vocabulary entry, the store also lists the instances it
+    occurs in.
+
+    Element-wise predicates (like a regular expression on tokens) are then evaluated once per vocabulary entry instead
+    of once per occurrence, and only the instances that contain a matching entry are visited.
+
+    String entries of the vocabulary are additionally indexed by their trigrams. If a predicate can only hold for
+    strings that contain certain literals (see regex_literals.py), only the entries that contain all trigrams of those
+    literals are evaluated.
+
+    Building the store and finding elements in it call an optional progress callback every SEARCH_PROGRESS_INTERVAL
+    instances or vocabulary entries, so that a search can yield to other tasks or be cancelled in between.
+    """
+
+    def __init__(self, vocabulary: List[Any], element_ids: array, offsets: array,
+                 vocabulary_instances: array, vocabulary_offsets: array,
+                 trigrams: Dict[str, array], non_string_ids: array):
+        self.vocabulary = vocabulary
+        # element_ids[offsets[i]:offsets[i + 1]] are the vocabulary ids of the elements of instance i
+        self.element_ids = element_ids
+        self.offsets = offsets
+        # vocabulary_instances[vocabulary_offsets[v]:vocabulary_offsets[v + 1]] are the instances that contain
+        # vocabulary entry v, in increasing order
+        self.vocabulary_instances = vocabulary_instances
+        self.vocabulary_offsets = vocabulary_offsets
+        # trigram -> ids of the string vocabulary entries that contain it, in increasing order
+        self.trigrams = trigrams
+        # ids of the vocabulary entries that are not strings, which the trigrams say nothing about
+        self.non_string_ids = non_string_ids
+
+    @staticmethod
+    def build(instances: List[Any], get_elements: Callable[[Any], List[Tuple[Any, Any]]],
+              progress: Optional[SearchProgress] = None) -> Optional["ElementStore"]:
+        """
+        :param get_elements: Returns the elements of an instance, paired with their highlight names, in the order in
+         which the outer search layer visits them.
+        :param progress: If given, called with the number of stored instances, 0 and the number of instances.
+        :return: None if the elements cannot be stored in a vocabulary (because they are not hashable).
+        """
+        vocabulary = []
+        vocabulary_ids: Dict[Any, int] = {}
+        instances_per_id: List[array] = []
+        element_ids = array("i")
+        offsets = array("i", [0])
+        try:
+            for instance_id, instance in enumerate(instances):
+                if progress is not None and instance_id % SEARCH_PROGRESS_INTERVAL == 0:
+                    progress(instance_id, 0, len(instances))
+                if instance is not None:
+                    for element, _ in get_elements(instance):
+                        vocabulary_id = vocabulary_ids.get(element)
+                        if vocabulary_id is None:
+                            vocabulary_id = len(vocabulary)
+                            vocabulary_ids[element] = vocabulary_id
+                            vocabulary.append(element)
+                            instances_per_id.append(array("i"))
+                        element_ids.append(vocabulary_id)
+                        instances_here = instances_per_id[vocabulary_id]
+                        if not instances_here or instances_here[-1] != instance_id:
+                            instances_here.append(instance_id)
+                offsets.append(len(element_ids))
+        except TypeError:
+            return None
+
+        vocabulary_instances = array("i")
+        vocabulary_offsets = array("i", [0])
+        for instances_here in instances_per_id:
+            vocabulary_instances.extend(instances_here)
+            vocabulary_offsets.append(len(vocabulary_instances))
+
+        trigrams: Dict[str, array] = {}
+        non_string_ids = array("i")
+        for vocabulary_id, element in enumerate(vocabulary):
+            if not isinstance(element, str):
+                non_string_ids.append(vocabulary_id)
+                continue
+            for trigram in {element[i:i + 3] for i in range(len(element) - 2)}:
+                if trigram not in trigrams:
+                    trigrams[trigram] = array("i")
+                trigrams[trigram].append(vocabulary_id)
+        return ElementStore(vocabulary, element_ids, offsets, vocabulary_instances, vocabulary_offsets,
+                            trigrams, non_string_ids)
+
+    def find(self, predicates: List[Callable[[Any], Any]],
+             instance_range: Optional[Tuple[int, int]] = None,
+             required_literals: Iterable[str] = (),
+             progress: Optional[SearchProgress] = None) -> Dict[int, List[int]]:
+        """
+        :param required_literals: Strings that every string element for which all predicates hold contains.
+        :param progress: If given, called with the number of checked vocabulary entries, the number of matching ones
+         and the number of entries to check, and then with the number of visited instances, the number of matching
+         ones and the number of instances to visit.
+        :return: A dict that maps the index of each instance that contains an element for which all predicates hold
+         to the positions of those elements in the instance, in increasing order. If instance_range = (start, stop) is
+         given, only the instances with start <= index < stop are considered.
+        """
+        candidate_ids = self._get_candidate_ids(required_literals)
+        if candidate_ids is None:
+            candidate_ids = range(len(self.vocabulary))
+        matching_ids = []
+        for checked, vocabulary_id in enumerate(candidate_ids, start=1):
+            if all(predicate(self.vocabulary[vocabulary_id]) for predicate in predicates):
+                matching_ids.append(vocabulary_id)
+            if progress is not None and checked % SEARCH_PROGRESS_INTERVAL == 0:
+                progress(checked, len(matching_ids), len(candidate_ids))
+        if not matching_ids:
+            return {}
+        is_matching_id = bytearray(len(self.vocabulary))
+        candidate_instances = set()
+        for vocabulary_id in matching_ids:
+            is_matching_id[vocabulary_id] = 1
+            candidate_instances.update(self.vocabulary_instances[self.vocabulary_offsets[vocabulary_id]:
+                                                                 self.vocabulary_offsets[vocabulary_id + 1]])
+
+        start, stop = instance_range if instance_range is not None else (0, len(self.offsets) - 1)
+        instance_ids = sorted(instance_id for instance_id in candidate_instances if start <= instance_id < stop)
+        results = {}
+        for visited, instance_id in enumerate(instance_ids, start=1):
+            element_ids = self.element_ids[self.offsets[instance_id]:self.offsets[instance_id + 1]]
+            results[instance_id] = [position for position, element_id in enumerate(element_ids)
+                                    if is_matching_id[element_id]]
+            if progress is not None and visited % SEARCH_PROGRESS_INTERVAL == 0:
+                progress(visited, len(results), len(instance_ids))
+        return results
+
+    def _get_candidate_ids(self, required_literals: Iterable[str]) -> Optional[List[int]]:
+        """
+        :return: The ids of the vocabulary entries that can contain all required literals, in increasing order, or None
+         if the literals do not restrict the entries.
+        """
+        required_trigrams = {literal[i:i + 3] for literal in required_literals for i in range(len(literal) - 2)}
+        if not required_trigrams:
+            return None
+        postings = sorted((self.trigrams.get(trigram, ()) for trigram in required_trigrams), key=len)
+        candidate_ids = set(postings[0])
+        for posting in postings[1:]:
+            if not candidate_ids:
+                break
+            candidate_ids.intersection_update(posting)
+        candidate_ids.update(self.non_string_ids)
+        return sorted(candidate_ids)
@@ -1,8 +1,9 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Any, Callable
 
 from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import edge_label_has_inverse_direction, \
     CHILD_NODES_KEY, INCOMING_EDGE_KEY
 from vulcan.search.graph_nodes.outer_graph_node_layer import InnerGraphNodeLayer
+from vulcan.search.inner_search_layer import InvalidSearchArguments
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
 
@@ -12,17 +13,26 @@ class HasAtLeastXOutgoingEdges(InnerGraphNodeLayer):
     """
 
     def apply(self, obj: Tuple[Dict, Dict], user_arguments: List[str]):
-        if obj is None:
-            return False
-        node = obj[0]
-        num_edges_required = int(user_arguments[0].strip())
-        num_outgoing_edges_found = 0
-        if edge_label_has_inverse_direction(node[INCOMING_EDGE_KEY]):
-            num_outgoing_edges_found += 1
-        for child in node[CHILD_NODES_KEY]:
-            if not edge_label_has_inverse_direction(child[INCOMING_EDGE_KEY]):
+        return self.compile(user_arguments)(obj)
+
+    def compile(self, user_arguments: List[str]) -> Callable[[Any], Any]:
+        try:
+            num_edges_required = int(user_arguments[0].strip())
+        except ValueError:
+            raise InvalidSearchArguments(f"Not a number of edges: {user_arguments[0]}")
+
+        def predicate(obj):
+            if obj is None:
+                return False
+            node = obj[0]
+            num_outgoing_edges_found = 0
+            if edge_label_has_inverse_direction(node[INCOMING_EDGE_KEY]):
                 num_outgoing_edges_found += 1
-        return num_outgoing_edges_found >= num_edges_required
+            for child in node[CHILD_NODES_KEY]:
+                if not edge_label_has_inverse_direction(child[INCOMING_EDGE_KEY]):
+                    num_outgoing_edges_found += 1
+            return num_outgoing_edges_found >= num_edges_required
+        return predicate
 
     def get_description(self) -> str:
         return "This checks if a node has at least X outgoing edges (i.e. edges that have this node as source). "
@@ -1,6 +1,7 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Any, Callable
 
 from vulcan.search.graph_nodes.outer_graph_node_layer import InnerGraphNodeLayer
+from vulcan.search.inner_search_layer import InvalidSearchArguments
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
 
@@ -10,18 +11,20 @@ class NodeContentEquals(InnerGraphNodeLayer):
     """
 
     def apply(self, obj: Tuple[Dict, Dict], user_arguments: List[str]):
-        if obj is None:
-            return False
-        if obj[0] is None:
-            print("Warning: null node in search")
-            print(obj)
-        if obj[0]["node_label"] is None:
-            # then we have an unlabeled node, or a reentrancy. either way, we don't want to match it
-            return False
+        return self.compile(user_arguments)(obj)
+
+    def compile(self, user_arguments: List[str]) -> Callable[[Any], Any]:
         if user_arguments[0] is None:
-            print("Warning: user argument")
-            print(user_arguments)
-        return obj[0]["node_label"].strip().lower() == user_arguments[0].strip().lower()
+            raise InvalidSearchArguments("No node label given.")
+        target = user_arguments[0].strip().lower()
+
+        def predicate(obj):
+            if obj is None:
+                return False
+            node_label = obj[0]["node_label"]
+            # unlabeled nodes and reentrancies never match
+            return node_label is not None and node_label.strip().lower() == target
+        return predicate
 
     def get_description(self) -> str:
         return "This checks if a node is labeled with the given string (modulo casing and outer whitespace)."
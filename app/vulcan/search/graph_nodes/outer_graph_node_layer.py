@@ -1,8 +1,8 @@
 from abc import ABC
-from typing import List, Any, Dict, Tuple
+from typing import List, Any, Dict, Tuple, Callable, Optional
 
 from vulcan.search.inner_search_layer import InnerSearchLayer
-from vulcan.search.outer_search_layer import OuterSearchLayer
+from vulcan.search.outer_search_layer import OuterSearchLayer, compile_inner_search_layers
 from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import for_each_node_top_down
 
 
@@ -17,18 +17,18 @@ class OuterGraphNodeLayer(OuterSearchLayer):
         return "OuterGraphNodeLayer"
 
     def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: Dict):
-        matching_node_names = []
-        for_each_node_top_down(obj, lambda node: self._apply_to_node(node, obj, inner_search_layers,
-                                                                     user_arguments, matching_node_names))
-        if len(matching_node_names) > 0:
-            return matching_node_names
-        else:
-            return None
-
-    def _apply_to_node(self, node, graph, inner_search_layers, user_arguments, matching_node_names: List[str]):
-        if all(inner_search_layer.apply((node, graph), user_args)
-               for inner_search_layer, user_args in zip(inner_search_layers, user_arguments)):
-            matching_node_names.append(node["node_name"])
+        return self.compile(compile_inner_search_layers(inner_search_layers, user_arguments))(obj)
+
+    def compile(self, inner_predicates: List[Callable[[Any], Any]]) -> Callable[[Dict], Optional[List[str]]]:
+        def search(obj: Dict):
+            matching_node_names = []
+
+            def apply_to_node(node):
+                if all(predicate((node, obj)) for predicate in inner_predicates):
+                    matching_node_names.append(node["node_name"])
+            for_each_node_top_down(obj, apply_to_node)
+            return matching_node_names if len(matching_node_names) > 0 else None
+        return search
 
 
 class InnerGraphNodeLayer(InnerSearchLayer, ABC):
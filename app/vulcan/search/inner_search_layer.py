@@ -1,4 +1,11 @@
-from typing import List, Any
+from typing import List, Any, Callable
+
+
+class InvalidSearchArguments(ValueError):
+    """
+    Raised when the arguments that the user put into the search bar cannot be used by a search layer.
+    """
+    pass
 
 
 class InnerSearchLayer:
@@ -32,3 +39,13 @@ class InnerSearchLayer:
         :return: True if the object matches the search criteria, False otherwise.
         """
         raise NotImplementedError()
+
+    def compile(self, user_arguments: List[str]) -> Callable[[Any], Any]:
+        """
+        Binds the user arguments once per search, so that they do not have to be processed again for every object.
+        Invalid user arguments raise an InvalidSearchArguments exception here.
+        :param user_arguments: See apply().
+        :return: A predicate that takes the object to check and returns a truthy value if the object matches the
+        search criteria, just like apply() would.
+        """
+        return lambda obj: self.apply(obj, user_arguments)
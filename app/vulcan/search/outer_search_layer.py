@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, Callable, List, Optional
 
 from vulcan.search.inner_search_layer import InnerSearchLayer
 
@@ -31,3 +31,33 @@ class OuterSearchLayer:
          None otherwise.
         """
         raise NotImplementedError()
+
+    def compile(self, inner_predicates: List[Callable[[Any], Any]]) -> Callable[[Any], Optional[List[Any]]]:
+        """
+        :param inner_predicates: The compiled inner search layers that must match here (see InnerSearchLayer.compile).
+        :return: A function that takes the object to check and returns the same as apply() would.
+        """
+        inner_search_layers = [_PredicateLayer(predicate) for predicate in inner_predicates]
+        user_arguments = [[] for _ in inner_predicates]
+        return lambda obj: self.apply(inner_search_layers, user_arguments, obj)
+
+
+def compile_inner_search_layers(inner_search_layers: List[InnerSearchLayer],
+                                user_arguments: List[List[str]]) -> List[Callable[[Any], Any]]:
+    """
+    Compiles each inner search layer with its user arguments, for outer search layers whose apply() calls compile().
+    """
+    return [inner_search_layer.compile(user_args)
+            for inner_search_layer, user_args in zip(inner_search_layers, user_arguments)]
+
+
+class _PredicateLayer(InnerSearchLayer):
+    """
+    Wraps a compiled inner search layer, so that it can be passed to apply().
+    """
+
+    def __init__(self, predicate: Callable[[Any], Any]):
+        self.predicate = predicate
+
+    def apply(self, obj: Any, user_arguments: List[str], **kwargs):
+        return self.predicate(obj)
@@ -0,0 +1,49 @@
+import re
+from typing import Any, List
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+
+def get_required_literals(pattern: str) -> List[str]:
+    """
+    Returns strings that occur in every string that the regular expression matches, e.g. ["ab", "de"] for "abc?de".
+    The result may be incomplete (and is empty if nothing can be derived, e.g. for alternatives or case-insensitive
+    patterns), but never contains a string that a match could lack.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return []
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+    literals = []
+    current = _collect_literals(list(parsed), literals, "")
+    if current:
+        literals.append(current)
+    return literals
+
+
+def _collect_literals(items: List[Any], literals: List[str], current: str) -> str:
+    """
+    Walks a parsed sequence, extends the current run of consecutive literal characters and adds finished runs to
+    literals. Returns the run that is still open at the end of the sequence.
+    """
+    for op, argument in items:
+        if op == sre_parse.LITERAL:
+            current += chr(argument)
+        elif op == sre_parse.SUBPATTERN and not argument[1] and not argument[2]:
+            # a group without flags is matched exactly once, as if its contents were inlined
+            current = _collect_literals(list(argument[3]), literals, current)
+        else:
+            if current:
+                literals.append(current)
+            current = ""
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and argument[0] >= 1:
+                # the repeated item occurs at least once, but is not necessarily adjacent to its surroundings
+                run = _collect_literals(list(argument[2]), literals, "")
+                if run:
+                    literals.append(run)
+    return current
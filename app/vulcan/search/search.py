@@ -16,15 +16,30 @@
 
 # MODIFICATIONS:
 # - Added `SearchFilter.serialize()`
-
-
-from typing import List, Optional, Any, Dict, Tuple, Union
+# - Added `find_matches_in_layout()` and `merge_search_highlights()`, so that search results can be stored as
+#   views over the searched layout.
+# - Search filters with an equality check are answered from an inverted index, and other filters on tokens and table
+#   cells from a columnar store of the distinct tokens and cells (see search_index.py and element_store.py).
+# - `_search_lists()` combines per-filter bitmaps of matching instances, evaluates cheap filters first and only
+#   collects highlights for the final matches.
+# - Search filters are compiled once per search (see `CompiledSearchFilter`), so that user arguments are processed
+#   and validated once instead of for every object.
+# - `find_matches_in_layout()` can report the progress of a search to a callback.
+# - `find_matches_in_layout()` can be restricted to a range of instances, so that a search can be split into shards.
+# - Added `create_list_of_possible_search_filters_for_slices()`, so that the search filters can be listed from the
+#   names and visualization types of the slices alone.
+
+
+from typing import List, Optional, Any, Dict, Tuple, Union, Iterable, Callable
 
 from vulcan.data_handling.data_corpus import CorpusSlice
+from vulcan.data_handling.visualization_type import VisualizationType
 from vulcan.search.graph_nodes.node_content_equals import NodeContentEquals
 from vulcan.search.graph_nodes.outer_graph_node_layer import OuterGraphNodeLayer
 from vulcan.search.inner_search_layer import InnerSearchLayer
 from vulcan.search.outer_search_layer import OuterSearchLayer
+from vulcan.search.search_index import get_search_index
+from vulcan.search.search_progress import SEARCH_PROGRESS_INTERVAL, SearchProgress
 from vulcan.search.search_registry import OUTER_SEARCH_LAYERS, INNER_SEARCH_LAYERS, VISUALIZATION_TYPE_TO_OUTER_SEARCH_LAYERS, \
     OUTER_TO_INNER_SEARCH_LAYERS
 from vulcan.search.table.column_count_at_least import ColumnCountAtLeast
@@ -56,15 +71,53 @@ class SearchFilter:
         }
 
 
+class CompiledSearchFilter:
+    """
+    A search filter with its search layers looked up and its user arguments bound once per search.
+    Raises InvalidSearchArguments if the filter's user arguments are invalid.
+    """
+
+    def __init__(self, search_filter: SearchFilter):
+        self.search_filter = search_filter
+        inner_search_layers = [get_inner_search_layer(name) for name in search_filter.inner_search_layer_names]
+        self.inner_predicates: List[Callable[[Any], Any]] = [
+            inner_search_layer.compile(user_args)
+            for inner_search_layer, user_args in zip(inner_search_layers, search_filter.inner_search_layer_arguments)]
+        self.search: Callable[[Any], Optional[List[Any]]] = \
+            get_outer_search_layer(search_filter.outer_search_layer_name).compile(self.inner_predicates)
+
+
 def perform_search_on_layout(layout: BasicLayout,
                              filters: List[SearchFilter]) -> 'BasicLayout':
-    lists_to_search: List[List[any]] = [_get_list_to_search(layout, f.corpus_slice_name) for f in filters]
-    matching_indices, highlight_dicts = _search_lists(lists_to_search, filters)
+    matching_indices, highlight_dicts = find_matches_in_layout(layout, filters)
     slices = _get_sub_slices_from_indices(layout, matching_indices, highlight_dicts)
     linkers = _get_sub_linkers_from_indices(layout, matching_indices)
     return BasicLayout(slices, linkers, len(matching_indices))
 
 
+def find_matches_in_layout(layout: BasicLayout,
+                           filters: List[SearchFilter],
+                           progress: Optional[SearchProgress] = None,
+                           instance_range: Optional[Tuple[int, int]] = None) -> Tuple[List[int], List[Dict]]:
+    """
+    Returns the indices of the instances that match all filters, together with a search highlight dict for each
+    matching instance (see _search_lists).
+
+    If given, only the instances with start <= index < stop are searched, where (start, stop) = instance_range. The
+    returned indices are still indices into the whole layout.
+
+    If given, progress is called regularly while filters are evaluated by scanning or looked up in the search index
+    (including while the index is built), with the number of scanned instances, the number of matches so far and the
+    number of instances to scan. The callback may raise an exception to abort the search.
+    """
+    compiled_filters = [CompiledSearchFilter(f) for f in filters]
+    lists_to_search: List[List[any]] = [_get_list_to_search(layout, f.corpus_slice_name) for f in filters]
+    search_index = get_search_index(layout)
+    indexed_results = [search_index.lookup(layout, f.search_filter, f.inner_predicates, instance_range, progress)
+                       for f in compiled_filters]
+    return _search_lists(lists_to_search, filters, indexed_results, compiled_filters, progress, instance_range)
+
+
 def _get_list_to_search(layout: BasicLayout, corpus_slice_name: str) -> List[any]:
     for row in layout.layout:
         for corpus_slice in row:
@@ -101,22 +154,30 @@ def _get_sub_slices_from_indices(layout: BasicLayout, matching_indices: List[int
 def _update_highlights(old_highlights: Optional[List[Dict[Any, Union[str, List[str]]]]],
                        search_highlight_dicts: List[Dict[Tuple[str, Any], Union[str, List[str]]]],
                        slice_name: str):
+    if old_highlights is None:
+        old_highlights = [None] * len(search_highlight_dicts)
+    return [merge_search_highlights(old_highlight, search_highlight_dict, slice_name)
+            for old_highlight, search_highlight_dict in zip(old_highlights, search_highlight_dicts)]
+
+
+def merge_search_highlights(old_highlight: Optional[Dict[Any, Union[str, List[str]]]],
+                            search_highlight_dict: Dict[Tuple[str, Any], Union[str, List[str]]],
+                            slice_name: str) -> Dict[Any, Union[str, List[str]]]:
+    """
+    Combines the search highlights of a single corpus entry with its old (base) highlights, and returns them in the
+    standard highlights format for the given corpus slice. The search highlight dict is not modified.
+    """
+    # only keep the search highlights that apply to this corpus slice
+    merged = {key: list(value) if isinstance(value, list) else value
+              for key, value in search_highlight_dict.items() if key[0] == slice_name}
+
     # update the search highlights with the old (base) highlights
-    if old_highlights is not None:
-        for old_highlight, search_highlight_dict in zip(old_highlights, search_highlight_dicts):  # iterate over corpus
-            for key, value in old_highlight.items():  # iterate over all highlights for this corpus entry
-                _add_highlight_color(search_highlight_dict, key, slice_name, value)
+    if old_highlight is not None:
+        for key, value in old_highlight.items():
+            _add_highlight_color(merged, key, slice_name, value)
 
     # now turn the updated search highlights into the standard highlights format for this corpus slice
-    ret = []
-    for search_highlight_dict in search_highlight_dicts:  # iterate over corpus
-        dict_here = {}
-        for key, value in search_highlight_dict.items():  # iterate over all highlights for this corpus entry
-            # print(key, value, slice_name)
-            if key[0] == slice_name:  # only keep the ones that apply to this corpus slice
-                dict_here[key[1]] = value
-        ret.append(dict_here)
-    return ret
+    return {key[1]: value for key, value in merged.items()}
 
 
 def _get_sub_linkers_from_indices(layout: BasicLayout, matching_indices: List[int]) -> List[dict]:
@@ -142,36 +203,113 @@ def _get_linker_name(linker, linker_index):
 
 
 def _search_lists(lists_to_search: List[List[any]],
-                  filters: List[SearchFilter]) -> Tuple[List[int], List[Dict]]:
-    outer_search_layers: List[OuterSearchLayer] = [get_outer_search_layer(f.outer_search_layer_name) for f in filters]
-    inner_search_layers_list: List[List[InnerSearchLayer]] = [[get_inner_search_layer(name)
-                                                          for name in f.inner_search_layer_names]
-                                                            for f in filters]
-    matching_indices = []
+                  filters: List[SearchFilter],
+                  indexed_results: Optional[List[Optional[Dict[int, List[Any]]]]] = None,
+                  compiled_filters: Optional[List[CompiledSearchFilter]] = None,
+                  progress: Optional[SearchProgress] = None,
+                  instance_range: Optional[Tuple[int, int]] = None) -> Tuple[List[int], List[Dict]]:
+    """
+    indexed_results contains, for each filter, either the result of looking the filter up in the search index, or
+    None if the filter must be evaluated by scanning the instances.
+
+    Each filter resolves to a bitmap of the instances it matches, and the bitmaps are combined with a bitwise AND.
+    Indexed filters are applied first, then the remaining filters in order of their estimated cost, each only on the
+    instances that matched all previous filters. Highlights are only collected for the instances that match all
+    filters.
+    """
+    if compiled_filters is None:
+        compiled_filters = [CompiledSearchFilter(f) for f in filters]
+    if indexed_results is None:
+        indexed_results = [None] * len(filters)
+
+    # like zip(*lists_to_search), only consider the instances that exist in all lists
+    corpus_size = min((len(list_to_search) for list_to_search in lists_to_search), default=0)
+    matching_bitmap = (1 << corpus_size) - 1
+    if instance_range is not None:
+        start, stop = instance_range
+        matching_bitmap &= ~((1 << max(start, 0)) - 1) & ((1 << max(stop, 0)) - 1)
+    # for each filter, maps the indices of the instances it matches to the node names to highlight
+    node_names_per_filter: List[Optional[Dict[int, List[Any]]]] = list(indexed_results)
+    for indexed_result in indexed_results:
+        if indexed_result is not None:
+            matching_bitmap &= _indices_to_bitmap(indexed_result.keys())
+
+    scanned_filter_positions = sorted((position for position, indexed_result in enumerate(indexed_results)
+                                       if indexed_result is None),
+                                      key=lambda position: _get_search_cost(filters[position]))
+    for position in scanned_filter_positions:
+        if not matching_bitmap:
+            break
+        search = compiled_filters[position].search
+        list_to_search = lists_to_search[position]
+        node_names_here = {}
+        indices_to_scan = _bitmap_to_indices(matching_bitmap)
+        for scanned, index in enumerate(indices_to_scan, start=1):
+            node_names = search(list_to_search[index])
+            if node_names is not None:
+                node_names_here[index] = node_names
+            if progress is not None and scanned % SEARCH_PROGRESS_INTERVAL == 0:
+                progress(scanned, len(node_names_here), len(indices_to_scan))
+        if progress is not None:
+            progress(len(indices_to_scan), len(node_names_here), len(indices_to_scan))
+        matching_bitmap &= _indices_to_bitmap(node_names_here.keys())
+        node_names_per_filter[position] = node_names_here
+
+    matching_indices = _bitmap_to_indices(matching_bitmap)
     highlight_dicts = []
-    for index, items in enumerate(zip(*lists_to_search)):
-        success = True
+    for highlighted, index in enumerate(matching_indices, start=1):
         highlighting_here = {}
-        for outer_search_layer, inner_search_layers, search_filter, item in \
-                zip(outer_search_layers, inner_search_layers_list, filters, items):
-            node_names_here = outer_search_layer.apply(inner_search_layers, search_filter.inner_search_layer_arguments,
-                                                       item)
-            if node_names_here is None:
-                # print(f"Search returned false for: {outer_search_layer.get_label()},"
-                #       f" {[l.get_label() for l in inner_search_layers]}, {inner_search_layer_arguments}, {item}")
-                success = False
-                break
-            else:
-                for nn in node_names_here:
-                    _add_highlight_color(highlighting_here, nn, search_filter.corpus_slice_name, search_filter.color)
-        if success:
-            matching_indices.append(index)
-            highlight_dicts.append(highlighting_here)
+        # add the highlights in the order of the filters, which determines the order of the colors
+        for search_filter, node_names_here in zip(filters, node_names_per_filter):
+            for nn in node_names_here[index]:
+                _add_highlight_color(highlighting_here, nn, search_filter.corpus_slice_name, search_filter.color)
+        highlight_dicts.append(highlighting_here)
+        if progress is not None and highlighted % SEARCH_PROGRESS_INTERVAL == 0:
+            progress(highlighted, len(matching_indices), len(matching_indices))
     # highlight_dicts maps node names (can be ints, tuples of ints or strings, or any other object really) to colors.
     # Colors can be a single string, or a list of strings, or a table (list of lists) of strings.
     return matching_indices, highlight_dicts
 
 
+# Estimated relative cost of evaluating an outer search layer on one instance. Cheaper filters are evaluated first,
+# so that they prune the instances the more expensive ones have to visit.
+_OUTER_SEARCH_LAYER_COSTS = {
+    "OuterTableAsAWholeLayer": 0,
+    "OuterStringTokensLayer": 1,
+    "OuterTableCellsLayer": 2,
+    "OuterGraphNodeLayer": 3,
+}
+
+
+def _get_search_cost(search_filter: SearchFilter) -> int:
+    return _OUTER_SEARCH_LAYER_COSTS.get(search_filter.outer_search_layer_name, 1)
+
+
+def _indices_to_bitmap(indices: Iterable[int]) -> int:
+    """
+    Returns an int in which bit i is set for each index i.
+    """
+    indices = list(indices)
+    if not indices:
+        return 0
+    bits = bytearray((max(indices) >> 3) + 1)
+    for index in indices:
+        bits[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _bitmap_to_indices(bitmap: int) -> List[int]:
+    """
+    Returns the indices of the set bits of the bitmap, in increasing order.
+    """
+    indices = []
+    for byte_index, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, "little")):
+        if byte:
+            offset = byte_index << 3
+            indices.extend(offset + bit for bit in range(8) if byte >> bit & 1)
+    return indices
+
+
 def _add_highlight_color(highlight_dict: Dict[Tuple[str, Any], Union[str, List[str]]],
                          node_name: Any,
                          slice_name: str,
@@ -215,25 +353,28 @@ def get_inner_search_layer(name: str) -> InnerSearchLayer:
 
 
 def create_list_of_possible_search_filters(layout: BasicLayout):
+    return create_list_of_possible_search_filters_for_slices(
+        [(corpus_slice.name, corpus_slice.visualization_type) for row in layout.layout for corpus_slice in row]
+    )
+
+
+def create_list_of_possible_search_filters_for_slices(slices: List[Tuple[str, VisualizationType]]):
     ret = {}
-    for row in layout.layout:
-        for corpus_slice in row:
-            name = corpus_slice.name
-            visualization_type = corpus_slice.visualization_type
-            slice_dict = {}
-            for outer_search_layer_id in VISUALIZATION_TYPE_TO_OUTER_SEARCH_LAYERS[visualization_type]:
-                outer_search_layer = OUTER_SEARCH_LAYERS[outer_search_layer_id]
-                outer_layer_dict = {"label": outer_search_layer.get_label(),
-                                    "description": outer_search_layer.get_description(),
-                                    "innerLayers": {}}
-                for inner_search_layer_id in OUTER_TO_INNER_SEARCH_LAYERS[outer_search_layer_id]:
-                    inner_search_layer = INNER_SEARCH_LAYERS[inner_search_layer_id]
-                    inner_layer_dict = {"label": inner_search_layer.get_label(),
-                                        "description": inner_search_layer.get_description()}
-                    outer_layer_dict["innerLayers"][inner_search_layer_id] = inner_layer_dict
-
-                slice_dict[outer_search_layer_id] = outer_layer_dict
-
-            ret[name] = slice_dict
+    for name, visualization_type in slices:
+        slice_dict = {}
+        for outer_search_layer_id in VISUALIZATION_TYPE_TO_OUTER_SEARCH_LAYERS[visualization_type]:
+            outer_search_layer = OUTER_SEARCH_LAYERS[outer_search_layer_id]
+            outer_layer_dict = {"label": outer_search_layer.get_label(),
+                                "description": outer_search_layer.get_description(),
+                                "innerLayers": {}}
+            for inner_search_layer_id in OUTER_TO_INNER_SEARCH_LAYERS[outer_search_layer_id]:
+                inner_search_layer = INNER_SEARCH_LAYERS[inner_search_layer_id]
+                inner_layer_dict = {"label": inner_search_layer.get_label(),
+                                    "description": inner_search_layer.get_description()}
+                outer_layer_dict["innerLayers"][inner_search_layer_id] = inner_layer_dict
+
+            slice_dict[outer_search_layer_id] = outer_layer_dict
+
+        ret[name] = slice_dict
     return ret
 
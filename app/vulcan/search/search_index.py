@@ -0,0 +1,231 @@
+from array import array
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from vulcan.data_handling.data_corpus import CorpusSlice
+from vulcan.data_handling.linguistic_objects.graphs.graph_as_dict import for_each_node_top_down, NODE_LABEL_KEY, \
+    NODE_NAME_KEY
+from vulcan.data_handling.linguistic_objects.table import cell_coordinates_to_cell_name
+from vulcan.data_handling.visualization_type import VisualizationType
+from vulcan.search.element_store import ElementStore
+from vulcan.search.regex_literals import get_required_literals
+from vulcan.search.search_progress import SEARCH_PROGRESS_INTERVAL, SearchProgress
+from vulcan.server.basic_layout import BasicLayout
+
+
+def _string_elements(instance: List[str]) -> List[Tuple[Any, Any]]:
+    return [(token, i) for i, token in enumerate(instance)]
+
+
+def _table_elements(instance: List[List[Any]]) -> List[Tuple[Any, Any]]:
+    # same iteration order and cell names as OuterTableCellsLayer
+    return [(cell, cell_coordinates_to_cell_name(i, j))
+            for j, column in enumerate(instance)
+            for i, cell in enumerate(column)]
+
+
+def _graph_elements(instance: Dict) -> List[Tuple[Any, Any]]:
+    # same iteration order and node names as OuterGraphNodeLayer
+    nodes = []
+    for_each_node_top_down(instance, nodes.append)
+    return [((node, instance), node[NODE_NAME_KEY]) for node in nodes]
+
+
+def _token_key(token: Any) -> Optional[str]:
+    return token.strip().lower() if isinstance(token, str) else None
+
+
+def _cell_key(cell: Any) -> Optional[str]:
+    if isinstance(cell, tuple) and len(cell) == 2 and cell[0] == VisualizationType.STRING \
+            and isinstance(cell[1], str):
+        return cell[1].strip().lower()
+    return None
+
+
+def _node_key(node_and_graph: Tuple[Dict, Dict]) -> Optional[str]:
+    label = node_and_graph[0][NODE_LABEL_KEY]
+    return label.strip().lower() if isinstance(label, str) else None
+
+
+class _IndexedLayer:
+    def __init__(self, equality_layer_name: str, visualization_types: List[str],
+                 get_elements: Callable[[Any], List[Tuple[Any, Any]]], get_key: Callable[[Any], Optional[str]],
+                 has_element_store: bool):
+        self.equality_layer_name = equality_layer_name
+        self.visualization_types = visualization_types
+        self.get_elements = get_elements
+        self.get_key = get_key
+        self.has_element_store = has_element_store
+
+
+# For each outer search layer that can be answered from the index: the inner search layer that checks for equality
+# with the user argument, the slice types it is used on, how the outer layer iterates over the elements of an
+# instance (paired with their highlight names), and the normalized content of an element that the inner layer
+# compares with the (equally normalized) user argument. Filters on layers with an element store are answered from the
+# store if they do not contain the equality check, since all inner layers of these outer layers are element-wise.
+INDEXED_OUTER_SEARCH_LAYERS = {
+    "OuterStringTokensLayer": _IndexedLayer("TokenContentEquals", [VisualizationType.STRING],
+                                            _string_elements, _token_key, True),
+    "OuterTableCellsLayer": _IndexedLayer("CellContentEquals", [VisualizationType.TABLE],
+                                          _table_elements, _cell_key, True),
+    "OuterGraphNodeLayer": _IndexedLayer("NodeContentEquals", [VisualizationType.GRAPH, VisualizationType.TREE],
+                                         _graph_elements, _node_key, False),
+}
+
+
+# Inner search layers that hold for an element if their regular expression (the first user argument) matches it.
+REGEX_INNER_SEARCH_LAYERS = {"TokenContentMatches", "CellContentMatches"}
+
+
+class SearchIndex:
+    """
+    Inverted index over the tokens, table cells and graph node labels of a layout. It maps the case-folded, stripped
+    content of each element to a posting list of the instances it occurs in and its position in those instances.
+    Posting lists are built lazily, once per corpus slice.
+
+    Search filters that contain an equality check (TokenContentEquals, CellContentEquals, NodeContentEquals) are
+    answered from the posting lists: only the elements listed there are checked against the filter's inner search
+    layers, instead of every element of every instance.
+
+    Other filters on tokens and table cells (e.g. regular expressions) are answered from an ElementStore of the corpus
+    slice, which evaluates the filter once per distinct token or cell. Element stores are also built lazily. Regular
+    expressions are only evaluated on the distinct tokens or cells that contain the trigrams of their literal parts.
+    """
+
+    def __init__(self):
+        # (slice name, outer search layer name) -> key -> (instance ids, element positions)
+        self._postings: Dict[Tuple[str, str], Dict[str, Tuple[array, array]]] = {}
+        # (slice name, outer search layer name) -> element store, or None if the slice cannot be stored
+        self._element_stores: Dict[Tuple[str, str], Optional[ElementStore]] = {}
+        self._lock = Lock()
+
+    def lookup(self, layout: BasicLayout, search_filter, inner_predicates: List[Callable[[Any], Any]],
+               instance_range: Optional[Tuple[int, int]] = None,
+               progress: Optional[SearchProgress] = None) -> Optional[Dict[int, List[Any]]]:
+        """
+        :param inner_predicates: The compiled inner search layers of the search filter.
+        :param instance_range: If given as (start, stop), only the instances with start <= index < stop are looked up.
+        :param progress: If given, called every SEARCH_PROGRESS_INTERVAL instances while the posting lists or the
+         element store are built, and every SEARCH_PROGRESS_INTERVAL entries while the filter is checked against them.
+        :return: None if the filter cannot be answered from the index. Otherwise, a dict that maps the index of each
+         instance that matches the filter to the names of the matching elements, in the order in which the outer
+         search layer would have found them.
+        """
+        indexed_layer = INDEXED_OUTER_SEARCH_LAYERS.get(search_filter.outer_search_layer_name)
+        if indexed_layer is None:
+            return None
+        corpus_slice = _get_corpus_slice(layout, search_filter.corpus_slice_name)
+        if corpus_slice is None or corpus_slice.visualization_type not in indexed_layer.visualization_types:
+            return None
+        start, stop = instance_range if instance_range is not None else (0, len(corpus_slice.instances))
+        if indexed_layer.equality_layer_name not in search_filter.inner_search_layer_names:
+            if not indexed_layer.has_element_store:
+                return None
+            element_store = self._get_element_store(corpus_slice, search_filter.outer_search_layer_name,
+                                                    indexed_layer, progress)
+            if element_store is None:
+                return None
+            required_literals = [literal
+                                 for name, user_args in zip(search_filter.inner_search_layer_names,
+                                                            search_filter.inner_search_layer_arguments)
+                                 if name in REGEX_INNER_SEARCH_LAYERS
+                                 for literal in get_required_literals(user_args[0])]
+            found = element_store.find(inner_predicates, (start, stop), required_literals, progress)
+            results = {}
+            for named, (instance_id, positions) in enumerate(found.items(), start=1):
+                elements = indexed_layer.get_elements(corpus_slice.instances[instance_id])
+                results[instance_id] = [elements[position][1] for position in positions]
+                if progress is not None and named % SEARCH_PROGRESS_INTERVAL == 0:
+                    progress(named, len(results), len(found))
+            return results
+
+        equality_position = search_filter.inner_search_layer_names.index(indexed_layer.equality_layer_name)
+        key = search_filter.inner_search_layer_arguments[equality_position][0].strip().lower()
+        instance_ids, positions = self._get_postings(corpus_slice, search_filter.outer_search_layer_name,
+                                                     indexed_layer, progress).get(key, ((), ()))
+
+        # posting lists are sorted by instance id
+        first, last = bisect_left(instance_ids, start), bisect_left(instance_ids, stop)
+        results = {}
+        elements = None
+        current_instance_id = None
+        for checked, (instance_id, position) in enumerate(zip(instance_ids[first:last], positions[first:last]),
+                                                          start=1):
+            if instance_id != current_instance_id:
+                elements = indexed_layer.get_elements(corpus_slice.instances[instance_id])
+                current_instance_id = instance_id
+            obj, name = elements[position]
+            if all(predicate(obj) for predicate in inner_predicates):
+                results.setdefault(instance_id, []).append(name)
+            if progress is not None and checked % SEARCH_PROGRESS_INTERVAL == 0:
+                progress(checked, len(results), last - first)
+        return results
+
+    def _get_postings(self, corpus_slice: CorpusSlice, outer_search_layer_name: str,
+                      indexed_layer: _IndexedLayer,
+                      progress: Optional[SearchProgress] = None) -> Dict[str, Tuple[array, array]]:
+        key = (corpus_slice.name, outer_search_layer_name)
+        with self._lock:
+            postings = self._postings.get(key)
+        if postings is None:
+            postings = _build_postings(corpus_slice, indexed_layer, progress)
+            with self._lock:
+                postings = self._postings.setdefault(key, postings)
+        return postings
+
+    def _get_element_store(self, corpus_slice: CorpusSlice, outer_search_layer_name: str,
+                           indexed_layer: _IndexedLayer,
+                           progress: Optional[SearchProgress] = None) -> Optional[ElementStore]:
+        key = (corpus_slice.name, outer_search_layer_name)
+        with self._lock:
+            if key in self._element_stores:
+                return self._element_stores[key]
+        element_store = ElementStore.build(corpus_slice.instances, indexed_layer.get_elements, progress)
+        with self._lock:
+            return self._element_stores.setdefault(key, element_store)
+
+
+def _build_postings(corpus_slice: CorpusSlice, indexed_layer: _IndexedLayer,
+                    progress: Optional[SearchProgress] = None) -> Dict[str, Tuple[array, array]]:
+    postings = {}
+    for instance_id, instance in enumerate(corpus_slice.instances):
+        if progress is not None and instance_id % SEARCH_PROGRESS_INTERVAL == 0:
+            progress(instance_id, 0, len(corpus_slice.instances))
+        if instance is None:
+            continue
+        for position, (obj, _) in enumerate(indexed_layer.get_elements(instance)):
+            key = indexed_layer.get_key(obj)
+            if key is None:
+                continue
+            if key not in postings:
+                postings[key] = (array("i"), array("i"))
+            instance_ids, positions = postings[key]
+            instance_ids.append(instance_id)
+            positions.append(position)
+    return postings
+
+
+def _get_corpus_slice(layout: BasicLayout, corpus_slice_name: str) -> Optional[CorpusSlice]:
+    for row in layout.layout:
+        for corpus_slice in row:
+            if corpus_slice.name == corpus_slice_name:
+                return corpus_slice
+    return None
+
+
+_search_indices: "WeakKeyDictionary[BasicLayout, SearchIndex]" = WeakKeyDictionary()
+_search_indices_lock = Lock()
+
+
+def get_search_index(layout: BasicLayout) -> SearchIndex:
+    """
+    :return: The search index of the layout. It is created once per layout and shared by all searches on it.
+    """
+    with _search_indices_lock:
+        search_index = _search_indices.get(layout)
+        if search_index is None:
+            search_index = SearchIndex()
+            _search_indices[layout] = search_index
+        return search_index
@@ -0,0 +1,9 @@
+from typing import Callable
+
+# Progress callback of a search. It is called regularly with the number of scanned instances (or index entries), the
+# number of matches so far and the number of instances (or index entries) to scan, and may raise an exception to abort
+# the search.
+SearchProgress = Callable[[int, int, int], None]
+
+# Number of scanned instances between two calls of the progress callback of a search.
+SEARCH_PROGRESS_INTERVAL = 256
@@ -1,8 +1,8 @@
 from abc import ABC
-from typing import List, Any
+from typing import List, Any, Callable, Optional
 
 from vulcan.search.inner_search_layer import InnerSearchLayer
-from vulcan.search.outer_search_layer import OuterSearchLayer
+from vulcan.search.outer_search_layer import OuterSearchLayer, compile_inner_search_layers
 
 
 class OuterStringTokensLayer(OuterSearchLayer):
@@ -17,24 +17,13 @@ class OuterStringTokensLayer(OuterSearchLayer):
         return "OuterStringTokensLayer"
 
     def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: List[str]):
-        # print(obj)
-        # TODO make different versions of this class for strings and tables
-        # for row in obj:
-        ret = []
-        for i, cell in enumerate(obj):  # in row:
-            result = True
-            for inner_search_layer, user_args in zip(inner_search_layers, user_arguments):
-                if inner_search_layer.apply(cell, user_args):
-                    pass
-                else:
-                    result = False
-                    print(cell, inner_search_layer.get_label(), user_args)
-            if result:
-                ret.append(i)
-        if len(ret) > 0:
-            return ret
-        else:
-            return None
+        return self.compile(compile_inner_search_layers(inner_search_layers, user_arguments))(obj)
+
+    def compile(self, inner_predicates: List[Callable[[Any], Any]]) -> Callable[[List[str]], Optional[List[int]]]:
+        def search(obj: List[str]):
+            ret = [i for i, cell in enumerate(obj) if all(predicate(cell) for predicate in inner_predicates)]
+            return ret if len(ret) > 0 else None
+        return search
 
 
 class InnerTableCellsLayer(InnerSearchLayer, ABC):
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Any, Callable
 
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
@@ -9,7 +9,11 @@ class TokenContentEquals(InnerTableCellsLayer):
     """
 
     def apply(self, obj: str, user_arguments: List[str]):
-        return obj is not None and obj.strip().lower() == user_arguments[0].strip().lower()
+        return self.compile(user_arguments)(obj)
+
+    def compile(self, user_arguments: List[str]) -> Callable[[Any], Any]:
+        target = user_arguments[0].strip().lower()
+        return lambda obj: obj is not None and obj.strip().lower() == target
 
     def get_description(self) -> str:
         return "This checks if the token equals the given string (modulo casing and outer whitespace)."
@@ -1,5 +1,6 @@
-from typing import List
+from typing import List, Any, Callable
 
+from vulcan.search.inner_search_layer import InvalidSearchArguments
 from vulcan.search.table.outer_table_as_a_whole_layer import InnerTableLayer
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
@@ -10,13 +11,14 @@ class ColumnCountAtLeast(InnerTableLayer):
     """
 
     def apply(self, obj: List[List[str]], user_arguments: List[str]):
-        # read first argument as integer
+        return self.compile(user_arguments)(obj)
+
+    def compile(self, user_arguments: List[str]) -> Callable[[Any], Any]:
         try:
             min_column_count = int(user_arguments[0])
         except ValueError:
-            # TODO error handling: send some feedback to client
-            return False
-        return obj is not None and len(obj[0]) >= min_column_count
+            raise InvalidSearchArguments(f"Not a number: {user_arguments[0]}")
+        return lambda obj: obj is not None and len(obj[0]) >= min_column_count
 
     def get_description(self) -> str:
         return "Checks minimum sentence length / table width."
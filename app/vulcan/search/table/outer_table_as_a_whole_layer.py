@@ -1,8 +1,8 @@
 from abc import ABC
-from typing import List, Any
+from typing import List, Any, Callable, Optional
 
 from vulcan.search.inner_search_layer import InnerSearchLayer
-from vulcan.search.outer_search_layer import OuterSearchLayer
+from vulcan.search.outer_search_layer import OuterSearchLayer, compile_inner_search_layers
 
 
 class OuterTableAsAWholeLayer(OuterSearchLayer):
@@ -16,10 +16,10 @@ class OuterTableAsAWholeLayer(OuterSearchLayer):
         return "OuterTableAsAWholeLayer"
 
     def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: List[List[str]]):
-        for inner_search_layer, user_args in zip(inner_search_layers, user_arguments):
-            if not inner_search_layer.apply(obj, user_args):
-                return None
-        return []
+        return self.compile(compile_inner_search_layers(inner_search_layers, user_arguments))(obj)
+
+    def compile(self, inner_predicates: List[Callable[[Any], Any]]) -> Callable[[List[List[str]]], Optional[List]]:
+        return lambda obj: [] if all(predicate(obj) for predicate in inner_predicates) else None
 
 
 class InnerTableLayer(InnerSearchLayer, ABC):
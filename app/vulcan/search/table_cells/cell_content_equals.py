@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Any, Callable
 
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 from vulcan.data_handling.visualization_type import VisualizationType
@@ -10,11 +10,18 @@ class CellContentEquals(InnerTableCellsLayer):
     """
 
     def apply(self, obj: str, user_arguments: List[str]):
-        if isinstance(obj, tuple) and len(obj) == 2 and obj[0] == VisualizationType.STRING:
-            obj = obj[1]
-        else:
-            return False
-        return obj is not None and isinstance(obj, str) and obj.strip().lower() == user_arguments[0].strip().lower()
+        return self.compile(user_arguments)(obj)
+
+    def compile(self, user_arguments: List[str]) -> Callable[[Any], Any]:
+        target = user_arguments[0].strip().lower()
+
+        def predicate(obj):
+            if isinstance(obj, tuple) and len(obj) == 2 and obj[0] == VisualizationType.STRING:
+                obj = obj[1]
+            else:
+                return False
+            return obj is not None and isinstance(obj, str) and obj.strip().lower() == target
+        return predicate
 
     def get_description(self) -> str:
         return "This checks if the cell content equals the given string (modulo casing and outer whitespace)."
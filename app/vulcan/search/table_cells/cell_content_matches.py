@@ -1,5 +1,7 @@
 import re
-from typing import List
+from typing import List, Any, Callable
+
+from vulcan.search.inner_search_layer import InvalidSearchArguments
 
 from vulcan.search.table_cells.outer_table_cells_layer import InnerTableCellsLayer
 
@@ -10,7 +12,14 @@ class CellContentMatches(InnerTableCellsLayer):
     """
 
     def apply(self, obj: str, user_arguments: List[str]):
-        return obj is not None and re.compile(user_arguments[0]).match(obj)
+        return self.compile(user_arguments)(obj)
+
+    def compile(self, user_arguments: List[str]) -> Callable[[Any], Any]:
+        try:
+            pattern = re.compile(user_arguments[0])
+        except re.error as e:
+            raise InvalidSearchArguments(f"Invalid regular expression: {user_arguments[0]} ({e})")
+        return lambda obj: obj is not None and pattern.match(obj)
 
     def get_description(self) -> str:
         return "This checks if the cell content contains a match for the given regular expression."
@@ -1,9 +1,9 @@
 from abc import ABC
-from typing import List, Any, Tuple
+from typing import List, Any, Tuple, Callable, Optional
 
 from vulcan.data_handling.linguistic_objects.table import cell_coordinates_to_cell_name
 from vulcan.search.inner_search_layer import InnerSearchLayer
-from vulcan.search.outer_search_layer import OuterSearchLayer
+from vulcan.search.outer_search_layer import OuterSearchLayer, compile_inner_search_layers
 
 
 class OuterTableCellsLayer(OuterSearchLayer):
@@ -17,28 +17,16 @@ class OuterTableCellsLayer(OuterSearchLayer):
         return "OuterTableCellsLayer"
 
     def apply(self, inner_search_layers: List[InnerSearchLayer], user_arguments: List[List[str]], obj: List[List[Tuple]]):
-        # print(obj)
-        # TODO make different versions of this class for strings and tables
-        ret = []
-        for j, column in enumerate(obj):
-            for i, cell in enumerate(column):  # in row:
-                result = True
-                for inner_search_layer, user_args in zip(inner_search_layers, user_arguments):
-                    if inner_search_layer.apply(cell, user_args):
-                        pass
-                    else:
-                        result = False
-                        break
-                        # print(cell, inner_search_layer.get_label(), user_args)
-                if result:
-                    print("len obj", len(obj))
-                    print("len row", len(column))
-                    print(f"i: {i}, j: {j}, cell: {str(cell)}")
-                    ret.append(cell_coordinates_to_cell_name(i, j))
-        if len(ret) > 0:
-            return ret
-        else:
-            return None
+        return self.compile(compile_inner_search_layers(inner_search_layers, user_arguments))(obj)
+
+    def compile(self, inner_predicates: List[Callable[[Any], Any]]) -> Callable[[List[List[Tuple]]], Optional[List[str]]]:
+        def search(obj: List[List[Tuple]]):
+            ret = [cell_coordinates_to_cell_name(i, j)
+                   for j, column in enumerate(obj)
+                   for i, cell in enumerate(column)
+                   if all(predicate(cell) for predicate in inner_predicates)]
+            return ret if len(ret) > 0 else None
+        return search
 
 
 class InnerTableCellsLayer(InnerSearchLayer, ABC):